@@ -4,8 +4,9 @@ Handles initialization, main loop, and resource management
 """
 import sys
 import time
+from contextlib import contextmanager
 from PyQt6.QtWidgets import QApplication, QMainWindow, QOpenGLWidget
-from PyQt6.QtCore import QTimer, Qt
+from PyQt6.QtCore import QTimer, Qt, QThread, QMutex
 from PyQt6.QtOpenGL import QOpenGLWidget
 import OpenGL.GL as gl
 import moderngl
@@ -13,14 +14,21 @@ import numpy as np
 
 
 class EngineApplication:
+    # Cap on the scene's time step, so a stall (a window drag, a breakpoint)
+    # doesn't move everything by one huge step; matches PhysicsThread's cap
+    MAX_FRAME_TIME = 0.25
+    
     def __init__(self):
         self.app = None
         self.main_window = None
         self.opengl_context = None
         self.renderer = None
         self.physics_system = None
+        self.physics_thread = None
         self.scene = None
         self.running = False
+        self._last_update_time = None
+        self._particle_frame = -1  # PhysicsThread.frame last handed to the renderer
         
     def initialize(self):
         """Initialize the engine application"""
@@ -33,7 +41,9 @@ class EngineApplication:
         self._init_physics()
         self._init_scene()
         
-        # Setup main loop timer
+        self.app.aboutToQuit.connect(self.shutdown)
+        
+        # Setup main loop timer (scene + rendering; physics runs on its own thread)
         self.timer = QTimer()
         self.timer.timeout.connect(self.update)
         self.timer.start(16)  # ~60 FPS
@@ -44,11 +54,13 @@ class EngineApplication:
         """Initialize rendering system"""
         from engine.rendering.renderer import DeferredRenderer
         self.renderer = DeferredRenderer(self.main_window.opengl_widget)
+        self.main_window.opengl_widget.render_callback = self.render_frame
+        self.main_window.opengl_widget.resize_callback = self.renderer.screen_resized
     
     def _init_physics(self):
         """Initialize physics system"""
-        from engine.physics.sph import SPHSystem
-        self.physics_system = SPHSystem()
+        from engine.physics.sph_cuda import create_sph_system
+        self.physics_system = create_sph_system()
     
     def _init_scene(self):
         """Initialize initial scene"""
@@ -58,27 +70,129 @@ class EngineApplication:
     def update(self):
         """Main update loop"""
         if self.running:
-            # Update physics
-            self.physics_system.update(1.0/60.0)  # 60 FPS delta time
+            # Step the scene by the real time since the last tick; QTimer
+            # wake-ups are too jittery to assume exactly 16 ms
+            now = time.perf_counter()
+            if self._last_update_time is None:
+                dt = 1.0/60.0
+            else:
+                dt = min(now - self._last_update_time, self.MAX_FRAME_TIME)
+            self._last_update_time = now
             
             # Update scene
-            self.scene.update(1.0/60.0)
-            
-            # Render
-            self.renderer.render(self.scene)
+            self.scene.update(dt)
             
-            # Update OpenGL widget
+            # Schedule a repaint; the widget renders in paintGL (see render_frame())
             self.main_window.opengl_widget.update()
     
+    def render_frame(self):
+        """Render the scene and the latest published particles (called from paintGL)"""
+        physics_thread = self.physics_thread
+        if physics_thread is not None and physics_thread.frame != self._particle_frame:
+            with physics_thread.front_positions() as positions:
+                self.renderer.set_particles(positions)
+                self._particle_frame = physics_thread.frame
+        
+        self.renderer.render(self.scene)
+    
     def run(self):
         """Run the application"""
+        # Start physics here rather than in initialize() so callers can swap
+        # in their own physics system first
+        self.physics_thread = PhysicsThread(self.physics_system)
+        self.physics_thread.start()
+        
         return self.app.exec()
     
     def shutdown(self):
         """Clean shutdown"""
         self.running = False
+        if self.physics_thread:
+            self.physics_thread.stop()
+            self.physics_thread.wait()
+            self.physics_thread = None
         if self.renderer:
-            self.renderer.cleanup()
+            # aboutToQuit fires outside paintGL, so no GL context is current
+            widget = self.main_window.opengl_widget
+            widget.makeCurrent()
+            try:
+                self.renderer.cleanup()
+            finally:
+                widget.doneCurrent()
+
+
+class PhysicsThread(QThread):
+    """Steps a physics system at a fixed timestep off the UI thread
+    
+    Particle positions are published through a pair of buffers: the thread
+    fills the back buffer after each batch of steps and swaps it to the front
+    under a mutex. Readers hold the same mutex while using the front buffer
+    (see front_positions()); ``frame`` counts the swaps, so readers can skip
+    positions they have already seen.
+    
+    Keep parallel=True Numba kernels on this thread only: the workqueue
+    threading layer Numba falls back to without TBB or OpenMP is not
+    thread safe.
+    """
+    # Cap on simulated time per wake-up so a stall can't snowball into an
+    # ever-growing backlog of steps
+    MAX_FRAME_TIME = 0.25
+    
+    def __init__(self, physics_system, fixed_dt: float = 1.0/60.0, parent=None):
+        super().__init__(parent)
+        self.physics_system = physics_system
+        self.fixed_dt = fixed_dt
+        self._running = False
+        
+        self._mutex = QMutex()
+        shape = (physics_system.particle_count, 3)
+        self._buffers = [np.array(physics_system.positions, dtype=np.float32),
+                         np.empty(shape, dtype=np.float32)]
+        self._front = 0
+        self.frame = 0
+    
+    def run(self):
+        """Fixed-timestep loop"""
+        self._running = True
+        accumulator = 0.0
+        previous = time.perf_counter()
+        
+        while self._running:
+            now = time.perf_counter()
+            accumulator += min(now - previous, self.MAX_FRAME_TIME)
+            previous = now
+            
+            if accumulator < self.fixed_dt:
+                time.sleep(self.fixed_dt - accumulator)
+                continue
+            
+            while accumulator >= self.fixed_dt:
+                self.physics_system.update(self.fixed_dt)
+                accumulator -= self.fixed_dt
+            self._publish()
+    
+    def stop(self):
+        """Ask the loop to exit after the current step"""
+        self._running = False
+    
+    @contextmanager
+    def front_positions(self):
+        """Lock and yield the latest published (N, 3) particle positions"""
+        self._mutex.lock()
+        try:
+            yield self._buffers[self._front]
+        finally:
+            self._mutex.unlock()
+    
+    def _publish(self):
+        """Copy positions into the back buffer and swap it to the front"""
+        back = 1 - self._front
+        self._buffers[back][:] = self.physics_system.positions
+        
+        self._mutex.lock()
+        self._front = back
+        self.frame += 1
+        self._mutex.unlock()
 
 
 class MainWindow(QMainWindow):
@@ -114,6 +228,8 @@ class OpenGLViewport(QOpenGLWidget):
         super().__init__(parent)
         self.ctx = None
         self.fbo = None
+        self.render_callback = None  # Draws a frame; called from paintGL
+        self.resize_callback = None  # Called from resizeGL with the new framebuffer bound
         
     def initializeGL(self):
         """Initialize OpenGL context"""
@@ -128,8 +244,13 @@ class OpenGLViewport(QOpenGLWidget):
     def resizeGL(self, width, height):
         """Handle resize events"""
         self.ctx.viewport = (0, 0, width, height)
+        if self.resize_callback is not None:
+            self.resize_callback()
         
     def paintGL(self):
         """Render the scene"""
-        # Clear the screen
-        self.ctx.clear(0.1, 0.1, 0.1, 1.0)  # Dark gray background
\ No newline at end of file
+        if self.render_callback is not None:
+            self.render_callback()
+        else:
+            # Clear the screen
+            self.ctx.clear(0.1, 0.1, 0.1, 1.0)  # Dark gray background
\ No newline at end of file
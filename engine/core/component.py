@@ -1,7 +1,32 @@
 """
 Base component classes for the entity-component system
 """
+import math
 import numpy as np
+from numba import njit
+from typing import Dict
+
+
+# Integer IDs for component types that have no dedicated slot on Entity
+COMPONENT_TYPES: Dict[type, int] = {}
+COMPONENT_TYPES_BY_NAME: Dict[str, type] = {}
+
+
+def component_type_id(component_type: type) -> int:
+    """Get the integer ID of a component type, registering it if needed"""
+    type_id = COMPONENT_TYPES.get(component_type)
+    if type_id is None:
+        type_id = len(COMPONENT_TYPES)
+        COMPONENT_TYPES[component_type] = type_id
+        COMPONENT_TYPES_BY_NAME[component_type.__name__] = component_type
+    return type_id
+
+
+def _read_only_copy(row: np.ndarray) -> np.ndarray:
+    """Copy of a storage row that raises on in-place writes instead of dropping them"""
+    row = row.copy()
+    row.flags.writeable = False
+    return row
 
 
 class Component:
@@ -15,59 +40,454 @@ class Component:
         pass
 
 
+class RowStorage:
+    """Structure-of-arrays storage with one row per owning handle
+    
+    Subclasses declare their per-row arrays once, in ``FIELDS``, as
+    (attribute, row shape, dtype, initial value); allocation, growth, row
+    copies and swap-removal all work from that list. ``owners[row]`` is the
+    handle that owns each row.
+    """
+    FIELDS = ()
+    
+    def __init__(self, capacity: int = 1):
+        self.count = 0
+        self.capacity = 0
+        self.owners = []
+        self._grow(capacity)
+    
+    def reserve(self, capacity: int):
+        """Make room for ``capacity`` rows so the next adds don't reallocate"""
+        if capacity > self.capacity:
+            self._grow(capacity)
+    
+    def _append_row(self, owner, source: 'RowStorage' = None, source_row: int = 0) -> int:
+        """Append a row for ``owner``, copied from ``source_row`` of ``source`` if given"""
+        if self.count == self.capacity:
+            self._grow(2 * self.count)
+        
+        row = self.count
+        self.count += 1
+        self.owners.append(owner)
+        if source is not None:
+            self._copy_row(row, source, source_row)
+        return row
+    
+    def _copy_row(self, row: int, source: 'RowStorage', source_row: int):
+        """Copy every field of ``source_row`` of ``source`` into ``row``"""
+        for name, _, _, _ in self.FIELDS:
+            getattr(self, name)[row] = getattr(source, name)[source_row]
+    
+    def _remove_row(self, row: int):
+        """Remove a row by moving the last row into its slot
+        
+        Row order is not preserved. Returns the owner of the moved row (whose
+        handle must be repointed at ``row``), or None if ``row`` was the last.
+        """
+        last = self.count - 1
+        moved = None
+        if row != last:
+            for name, _, _, _ in self.FIELDS:
+                array = getattr(self, name)
+                array[row] = array[last]
+            moved = self.owners[last]
+            self.owners[row] = moved
+        self.owners.pop()
+        self.count = last
+        return moved
+    
+    def _grow(self, capacity: int):
+        """Reallocate storage with room for at least ``capacity`` rows"""
+        capacity = max(capacity, 1)
+        n = self.count
+        
+        for name, shape, dtype, initial in self.FIELDS:
+            array = np.empty((capacity,) + shape, dtype=dtype)
+            array[n:] = initial
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+
+class TransformBuffer(RowStorage):
+    """Structure-of-arrays storage for transforms
+    
+    Every Transform owns one row of a buffer. Scenes keep a shared buffer
+    for their entities so all model matrices can be rebuilt in one batched
+    pass (see build_matrices); standalone transforms get a private one-row
+    buffer. ``version`` is bumped whenever any row changes.
+    """
+    FIELDS = (
+        ('positions', (3,), np.float32, 0.0),
+        ('rotations', (3,), np.float32, 0.0),  # Euler angles
+        ('scales', (3,), np.float32, 1.0),
+        ('matrices', (4, 4), np.float32, np.eye(4)),
+        ('dirty', (), np.bool_, True),
+    )
+    
+    def __init__(self, capacity: int = 1):
+        super().__init__(capacity)
+        self.version = 0
+    
+    def add(self, transform: 'Transform'):
+        """Move a transform's state into a new row of this buffer"""
+        row = self._append_row(transform, transform._buffer, transform._row)
+        self.dirty[row] = True
+        self.version += 1
+        
+        transform._buffer = self
+        transform._row = row
+    
+    def release(self, transform: 'Transform'):
+        """Move a transform out of this buffer into its own private storage
+        
+        The last row is moved into the freed slot, so row order is not
+        preserved.
+        """
+        row = transform._row
+        TransformBuffer().add(transform)
+        
+        moved = self._remove_row(row)
+        if moved is not None:
+            moved._row = row
+        self.version += 1
+    
+    def replace(self, old: 'Transform', new: 'Transform'):
+        """Give ``old``'s row to ``new``, moving ``old`` into private storage"""
+        row = old._row
+        TransformBuffer().add(old)
+        
+        self._copy_row(row, new._buffer, new._row)
+        self.dirty[row] = True
+        self.version += 1
+        self.owners[row] = new
+        new._buffer = self
+        new._row = row
+    
+    def update_matrices(self):
+        """Rebuild the model matrix of every row"""
+        n = self.count
+        build_matrices(self.positions[:n], self.rotations[:n], self.scales[:n], self.matrices[:n])
+        self.dirty[:n] = False
+
+
+@njit(fastmath=True, cache=True)
+def _write_matrix(positions, rotations, scales, i, out, k):
+    """Write translation @ rotation_y @ scale of row ``i`` into ``out[k]``"""
+    c = math.cos(rotations[i, 1])
+    s = math.sin(rotations[i, 1])
+    
+    out[k, 0, 0] = c * scales[i, 0]
+    out[k, 0, 1] = 0.0
+    out[k, 0, 2] = s * scales[i, 2]
+    out[k, 0, 3] = positions[i, 0]
+    
+    out[k, 1, 0] = 0.0
+    out[k, 1, 1] = scales[i, 1]
+    out[k, 1, 2] = 0.0
+    out[k, 1, 3] = positions[i, 1]
+    
+    out[k, 2, 0] = -s * scales[i, 0]
+    out[k, 2, 1] = 0.0
+    out[k, 2, 2] = c * scales[i, 2]
+    out[k, 2, 3] = positions[i, 2]
+    
+    out[k, 3, 0] = 0.0
+    out[k, 3, 1] = 0.0
+    out[k, 3, 2] = 0.0
+    out[k, 3, 3] = 1.0
+
+
+# The matrix kernels are deliberately serial. They run on the UI thread while
+# the physics thread runs the parallel SPH kernels, and Numba's fallback
+# workqueue threading layer aborts if parallel regions are launched from two
+# threads at once. A few flops per row are memory bound anyway.
+
+@njit(fastmath=True, cache=True)
+def build_matrices(positions, rotations, scales, out):
+    """Build translation @ rotation_y @ scale for every row (only Y rotation for now)"""
+    for i in range(positions.shape[0]):
+        _write_matrix(positions, rotations, scales, i, out, i)
+
+
+@njit(fastmath=True, cache=True)
+def gather_matrices(positions, rotations, scales, rows, out):
+    """Build the matrices of the given rows into ``out[0:len(rows)]``"""
+    for k in range(rows.shape[0]):
+        _write_matrix(positions, rotations, scales, rows[k], out, k)
+
+
 class Transform:
-    """Transform component holding position, rotation, scale"""
+    """Transform component holding position, rotation, scale
+    
+    A transform is a handle to one row of a TransformBuffer. The row moves
+    to new storage when the entity is added to or removed from a scene and
+    when the scene's buffer grows, so position, rotation and scale return
+    read-only copies; assign them (or use translate()) to make changes, e.g.
+    ``transform.position = transform.position + offset``. The model
+    matrix is cached and rebuilt only after a change (or when the owning
+    scene rebuilds all matrices). Call mark_dirty() after writing the
+    buffer's arrays directly.
+    """
     def __init__(self, position=None, rotation=None, scale=None):
-        self.position = np.array(position or [0.0, 0.0, 0.0], dtype=np.float32)
-        self.rotation = np.array(rotation or [0.0, 0.0, 0.0], dtype=np.float32)  # Euler angles
-        self.scale = np.array(scale or [1.0, 1.0, 1.0], dtype=np.float32)
+        self._buffer = None
+        self._row = 0
+        TransformBuffer().add(self)
+        
+        if position is not None:
+            self.position = position
+        if rotation is not None:
+            self.rotation = rotation  # Euler angles
+        if scale is not None:
+            self.scale = scale
+    
+    @property
+    def position(self) -> np.ndarray:
+        return _read_only_copy(self._buffer.positions[self._row])
+    
+    @position.setter
+    def position(self, value):
+        self._buffer.positions[self._row] = value
+        self._buffer.dirty[self._row] = True
+        self._buffer.version += 1
+    
+    @property
+    def rotation(self) -> np.ndarray:
+        return _read_only_copy(self._buffer.rotations[self._row])
+    
+    @rotation.setter
+    def rotation(self, value):
+        self._buffer.rotations[self._row] = value
+        self._buffer.dirty[self._row] = True
+        self._buffer.version += 1
+    
+    @property
+    def scale(self) -> np.ndarray:
+        return _read_only_copy(self._buffer.scales[self._row])
+    
+    @scale.setter
+    def scale(self, value):
+        self._buffer.scales[self._row] = value
+        self._buffer.dirty[self._row] = True
+        self._buffer.version += 1
+    
+    def translate(self, offset):
+        """Move the transform by ``offset``"""
+        self._buffer.positions[self._row] += offset
+        self._buffer.dirty[self._row] = True
+        self._buffer.version += 1
+    
+    def mark_dirty(self):
+        """Force the matrix to be rebuilt on the next get_matrix() call"""
+        self._buffer.dirty[self._row] = True
+        self._buffer.version += 1
+    
+    @property
+    def version(self) -> int:
+        """Change counter of this transform's buffer (shared with its other rows)"""
+        return self._buffer.version
     
     def get_matrix(self):
-        """Get transformation matrix"""
-        # Create translation matrix
-        translation = np.eye(4, dtype=np.float32)
-        translation[0:3, 3] = self.position
-        
-        # Create rotation matrix (simplified - only Y rotation for now)
-        ry = self.rotation[1]
-        rotation_y = np.array([
-            [np.cos(ry), 0, np.sin(ry), 0],
-            [0, 1, 0, 0],
-            [-np.sin(ry), 0, np.cos(ry), 0],
-            [0, 0, 0, 1]
-        ], dtype=np.float32)
-        
-        # Create scale matrix
-        scale = np.eye(4, dtype=np.float32)
-        scale[0, 0] = self.scale[0]
-        scale[1, 1] = self.scale[1]
-        scale[2, 2] = self.scale[2]
-        
-        # Combine transformations
-        return translation @ rotation_y @ scale
+        """Get transformation matrix (translation @ rotation_y @ scale)
+        
+        The returned array is a view into the cached matrix; treat it as
+        read-only, and don't keep it past the next change to the transform's
+        storage (see the class docstring).
+        """
+        buffer = self._buffer
+        row = self._row
+        m = buffer.matrices[row]
+        
+        if buffer.dirty[row]:
+            # Rotation is simplified - only Y rotation for now
+            ry = float(buffer.rotations[row, 1])
+            c = math.cos(ry)
+            s = math.sin(ry)
+            sx, sy, sz = buffer.scales[row].tolist()
+            px, py, pz = buffer.positions[row].tolist()
+            
+            m[0] = (c * sx, 0.0, s * sz, px)
+            m[1] = (0.0, sy, 0.0, py)
+            m[2] = (-s * sx, 0.0, c * sz, pz)
+            buffer.dirty[row] = False
+        
+        return m
 
 
 class Renderable:
-    """Component for renderable objects"""
+    """Component for renderable objects
+    
+    Assigning ``mesh`` or ``visible`` updates the owning scene's render state.
+    """
     def __init__(self, mesh=None, material=None):
-        self.mesh = mesh
+        self.entity = None
+        self._mesh = mesh
         self.material = material
-        self.visible = True
+        self._visible = True
+    
+    @property
+    def mesh(self):
+        return self._mesh
+    
+    @mesh.setter
+    def mesh(self, mesh):
+        self._mesh = mesh
+        self._changed()
+    
+    @property
+    def visible(self) -> bool:
+        return self._visible
+    
+    @visible.setter
+    def visible(self, visible: bool):
+        self._visible = visible
+        self._changed()
+    
+    def _changed(self):
+        entity = self.entity
+        if entity is not None and entity.scene is not None and entity.renderable is self:
+            entity.scene._renderable_changed(entity)
+
+
+class PhysicsWorld(RowStorage):
+    """Structure-of-arrays storage and batched integration for physics bodies
+    
+    Every PhysicsBody owns one row of a world. Scenes keep a shared world for
+    their entities; standalone bodies get a private one-row world. Body
+    positions are not duplicated here: ``transform_rows`` maps each body to
+    the row of its transform, and integrate() moves those rows directly.
+    """
+    FIELDS = (
+        ('velocities', (3,), np.float32, 0.0),
+        ('accelerations', (3,), np.float32, 0.0),
+        ('forces', (3,), np.float32, 0.0),
+        ('masses', (), np.float32, 1.0),
+        ('inv_mass', (), np.float32, 1.0),  # Zero for static bodies
+        ('is_static', (), np.bool_, False),
+        ('transform_rows', (), np.int64, -1),
+    )
+    
+    def add(self, body: 'PhysicsBody', transform_row: int = -1):
+        """Move a body's state into a new row of this world"""
+        index = self._append_row(body, body._world, body._index)
+        self.transform_rows[index] = transform_row
+        
+        body._world = self
+        body._index = index
+    
+    def release(self, body: 'PhysicsBody'):
+        """Move a body out of this world into its own private storage
+        
+        The last row is moved into the freed slot, so row order is not
+        preserved.
+        """
+        index = body._index
+        PhysicsWorld().add(body)
+        
+        moved = self._remove_row(index)
+        if moved is not None:
+            moved._index = index
+    
+    def clear_forces(self):
+        """Clear accumulated forces on all bodies"""
+        self.forces[:self.count] = 0.0
+    
+    def integrate(self, dt: float, transforms: TransformBuffer) -> bool:
+        """Integrate all dynamic bodies and clear their forces
+        
+        Args:
+            dt: Time step
+            transforms: Transform rows indexed by ``transform_rows``; moved
+                rows are marked dirty
+        
+        Returns:
+            Whether any position changed
+        """
+        n = self.count
+        self.accelerations[:n] = self.forces[:n] * self.inv_mass[:n, None]
+        self.velocities[:n] += self.accelerations[:n] * dt
+        
+        dynamic = ~self.is_static[:n]
+        velocities = self.velocities[:n][dynamic]
+        self.forces[:n] = 0.0
+        if not velocities.any():
+            return False
+        
+        rows = self.transform_rows[:n][dynamic]
+        transforms.positions[rows] += velocities * dt
+        transforms.dirty[rows] = True
+        transforms.version += 1
+        return True
 
 
 class PhysicsBody:
-    """Component for physics simulation"""
+    """Component for physics simulation
+    
+    A body is a handle to one row of a PhysicsWorld. Like Transform's, the
+    row moves when the body joins or leaves a scene's world, so velocity,
+    acceleration and forces return read-only copies; assign them (or use
+    add_force()/clear_forces()) to make changes.
+    """
     def __init__(self, mass=1.0, is_static=False):
-        self.mass = mass
+        self._world = None
+        self._index = 0
+        PhysicsWorld().add(self)
+        
         self.is_static = is_static
-        self.velocity = np.zeros(3, dtype=np.float32)
-        self.acceleration = np.zeros(3, dtype=np.float32)
-        self.forces = np.zeros(3, dtype=np.float32)
+        self.mass = mass
+    
+    @property
+    def mass(self) -> float:
+        return float(self._world.masses[self._index])
+    
+    @mass.setter
+    def mass(self, mass: float):
+        self._world.masses[self._index] = mass
+        self._update_inv_mass()
+    
+    @property
+    def is_static(self) -> bool:
+        return bool(self._world.is_static[self._index])
+    
+    @is_static.setter
+    def is_static(self, is_static: bool):
+        self._world.is_static[self._index] = is_static
+        self._update_inv_mass()
+    
+    @property
+    def velocity(self) -> np.ndarray:
+        return _read_only_copy(self._world.velocities[self._index])
+    
+    @velocity.setter
+    def velocity(self, velocity):
+        self._world.velocities[self._index] = velocity
+    
+    @property
+    def acceleration(self) -> np.ndarray:
+        return _read_only_copy(self._world.accelerations[self._index])
+    
+    @acceleration.setter
+    def acceleration(self, acceleration):
+        self._world.accelerations[self._index] = acceleration
+    
+    @property
+    def forces(self) -> np.ndarray:
+        return _read_only_copy(self._world.forces[self._index])
+    
+    @forces.setter
+    def forces(self, forces):
+        self._world.forces[self._index] = forces
     
     def add_force(self, force):
         """Add a force to the body"""
-        self.forces += force
+        self._world.forces[self._index] += force
     
     def clear_forces(self):
         """Clear accumulated forces"""
-        self.forces.fill(0.0)
\ No newline at end of file
+        self._world.forces[self._index] = 0.0
+    
+    def _update_inv_mass(self):
+        world, index = self._world, self._index
+        mass = world.masses[index]
+        world.inv_mass[index] = 0.0 if world.is_static[index] or mass <= 0.0 else 1.0 / mass
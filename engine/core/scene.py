@@ -3,33 +3,137 @@ Scene management system
 Handles entities, components, and scene graph
 """
 import numpy as np
-from typing import List, Dict, Optional
-from .component import Component, Transform
+from typing import List, Dict, Optional, Union
+from .component import (Component, Transform, TransformBuffer, Renderable, PhysicsBody,
+                        PhysicsWorld, COMPONENT_TYPES, COMPONENT_TYPES_BY_NAME, component_type_id,
+                        gather_matrices)
+
+
+# Well-known component types live in dedicated Entity attributes. Keyed by
+# both the class and its name so get_component() accepts either
+_COMPONENT_SLOTS = {
+    Transform: 'transform', 'Transform': 'transform',
+    Renderable: 'renderable', 'Renderable': 'renderable',
+    PhysicsBody: 'physics_body', 'PhysicsBody': 'physics_body',
+}
 
 
 class Entity:
-    """Basic entity in the scene"""
+    """Basic entity in the scene
+    
+    Transform, Renderable and PhysicsBody components are stored in the
+    ``transform``, ``renderable`` and ``physics_body`` attributes; read those
+    directly on hot paths. Other component types are kept by integer type ID
+    (see component_type_id).
+    """
+    __slots__ = ('_name', 'id', '_active', 'scene', '_transform', 'renderable',
+                 'physics_body', '_dyn_components')
+    
     def __init__(self, name: str = ""):
-        self.name = name
+        self._name = name
         self.id = id(self)
-        self.components: Dict[str, Component] = {}
-        self.active = True
-        self.transform = Transform()
+        self._active = True
+        self.scene = None
+        self._transform = Transform()
+        self.renderable: Optional[Renderable] = None
+        self.physics_body: Optional[PhysicsBody] = None
+        self._dyn_components: Dict[int, Component] = {}
+    
+    @property
+    def name(self) -> str:
+        return self._name
+    
+    @name.setter
+    def name(self, name: str):
+        if self.scene is not None:
+            # Keep the scene's name lookup in sync
+            self.scene._unindex_name(self)
+            self._name = name
+            self.scene._index_name(self)
+        else:
+            self._name = name
+    
+    @property
+    def active(self) -> bool:
+        return self._active
+    
+    @active.setter
+    def active(self, active: bool):
+        self._active = active
+        if self.scene is not None:
+            self.scene._activity_changed(self)
+    
+    @property
+    def transform(self) -> Transform:
+        return self._transform
+    
+    @transform.setter
+    def transform(self, transform: Transform):
+        if self.scene is not None:
+            # Keep the scene's transform storage in sync
+            self.scene.transforms.replace(self._transform, transform)
+        self._transform = transform
+        
+    @property
+    def components(self) -> Dict[str, Component]:
+        """Snapshot of all components (except the transform) keyed by type name"""
+        return {type(component).__name__: component for component in self.iter_components()}
+    
+    def iter_components(self):
+        """Iterate over all components except the transform"""
+        if self.renderable is not None:
+            yield self.renderable
+        if self.physics_body is not None:
+            yield self.physics_body
+        yield from self._dyn_components.values()
         
     def add_component(self, component: Component):
         """Add a component to the entity"""
-        component_type = type(component).__name__
-        self.components[component_type] = component
+        slot = _COMPONENT_SLOTS.get(type(component))
+        if slot is not None:
+            previous = getattr(self, slot)
+            setattr(self, slot, component)
+        else:
+            type_id = component_type_id(type(component))
+            previous = self._dyn_components.get(type_id)
+            self._dyn_components[type_id] = component
         component.entity = self
         
-    def get_component(self, component_type: str) -> Optional[Component]:
-        """Get a component by type"""
-        return self.components.get(component_type)
+        if self.scene is not None:
+            if previous is not None and previous is not component:
+                self.scene._component_removed(self, previous)
+            self.scene._component_added(self, component)
+        
+    def get_component(self, component_type: Union[type, str]) -> Optional[Component]:
+        """Get a component by type (class or class name)"""
+        slot = _COMPONENT_SLOTS.get(component_type)
+        if slot is not None:
+            return getattr(self, slot)
+        
+        if isinstance(component_type, str):
+            component_type = COMPONENT_TYPES_BY_NAME.get(component_type)
+        type_id = COMPONENT_TYPES.get(component_type)
+        if type_id is None:
+            return None
+        return self._dyn_components.get(type_id)
     
-    def remove_component(self, component_type: str):
-        """Remove a component by type"""
-        if component_type in self.components:
-            del self.components[component_type]
+    def remove_component(self, component_type: Union[type, str]):
+        """Remove a component by type (class or class name)"""
+        slot = _COMPONENT_SLOTS.get(component_type)
+        if slot == 'transform':
+            self.transform = Transform()
+            return
+        if slot is not None:
+            component = getattr(self, slot)
+            setattr(self, slot, None)
+        else:
+            if isinstance(component_type, str):
+                component_type = COMPONENT_TYPES_BY_NAME.get(component_type)
+            type_id = COMPONENT_TYPES.get(component_type)
+            component = self._dyn_components.pop(type_id, None)
+        
+        if component is not None and self.scene is not None:
+            self.scene._component_removed(self, component)
 
 
 class Scene:
@@ -37,36 +141,228 @@ class Scene:
     def __init__(self):
         self.entities: List[Entity] = []
         self.entity_map: Dict[int, Entity] = {}
+        self._index_of: Dict[int, int] = {}  # entity id -> index in self.entities
+        self._by_name: Dict[str, Dict[int, Entity]] = {}  # name -> {entity id: entity}, insertion ordered
         self.camera = None
         self.lights = []
         
+        # Bumped on changes to the entity/component set, entity activity and
+        # renderables; transform changes are tracked by transforms.version
+        self.version = 0
+        
+        # Transforms of all entities, stored contiguously so model matrices
+        # can be rebuilt for the whole scene in one pass. Row i always
+        # belongs to self.entities[i]
+        self.transforms = TransformBuffer(capacity=64)
+        
+        # Physics bodies of all entities, integrated in one batched pass
+        self.physics_world = PhysicsWorld(capacity=64)
+        
+        # Components that override update(), kept in sync by the
+        # _component_added/_component_removed hooks so update() doesn't have
+        # to walk every component of every entity
+        self._updatable_components: Dict[int, tuple] = {}  # component id -> (entity, component)
+        
+        # Per-row render state mirroring self.entities, so renderers can
+        # build their draw lists in compiled code. visible_mask is set for
+        # entities with a visible Renderable; mesh_ids indexes self.meshes
+        # (-1 without a Renderable)
+        self.active_mask = np.zeros(64, dtype=np.bool_)
+        self.visible_mask = np.zeros(64, dtype=np.bool_)
+        self.mesh_ids = np.full(64, -1, dtype=np.int32)
+        
+        # Every mesh used by a renderable in this scene, indexed by mesh ID
+        self.meshes: List = []
+        self._mesh_index: Dict[int, int] = {}  # id(mesh) -> mesh ID
+        
     def add_entity(self, entity: Entity) -> Entity:
         """Add an entity to the scene"""
+        index = len(self.entities)
+        self._reserve_rows(index + 1)
+        self._init_row(index, entity)
+        self._index_of[entity.id] = index
         self.entities.append(entity)
         self.entity_map[entity.id] = entity
+        self._index_name(entity)
+        self.transforms.add(entity.transform)
+        entity.scene = self
+        for component in entity.iter_components():
+            self._component_added(entity, component)
+        self.version += 1
         return entity
     
+    def add_entities(self, entities) -> List[Entity]:
+        """Add several entities at once
+        
+        Storage is grown once for the whole batch instead of per entity.
+        """
+        entities = list(entities)
+        start = len(self.entities)
+        self.transforms.reserve(self.transforms.count + len(entities))
+        self.physics_world.reserve(
+            self.physics_world.count
+            + sum(1 for entity in entities if entity.physics_body is not None)
+        )
+        self._reserve_rows(start + len(entities))
+        
+        self.entities.extend(entities)
+        for index, entity in enumerate(entities, start):
+            self._init_row(index, entity)
+            self._index_of[entity.id] = index
+            self.entity_map[entity.id] = entity
+            self._index_name(entity)
+            self.transforms.add(entity.transform)
+            entity.scene = self
+            for component in entity.iter_components():
+                self._component_added(entity, component)
+        self.version += 1
+        return entities
+    
     def remove_entity(self, entity: Entity):
-        """Remove an entity from the scene"""
-        if entity in self.entities:
-            self.entities.remove(entity)
-            if entity.id in self.entity_map:
-                del self.entity_map[entity.id]
+        """Remove an entity from the scene
+        
+        Swaps the last entity into the freed slot, so entity order is not
+        preserved.
+        """
+        index = self._index_of.pop(entity.id, None)
+        if index is None:
+            return
+        
+        for component in entity.iter_components():
+            self._component_removed(entity, component)
+        
+        # The transform buffer swap-removes the same way, keeping rows aligned
+        last = self.entities.pop()
+        self.transforms.release(entity.transform)
+        if last is not entity:
+            self.entities[index] = last
+            self._index_of[last.id] = index
+            row = len(self.entities)
+            for array in (self.active_mask, self.visible_mask, self.mesh_ids):
+                array[index] = array[row]
+            if last.physics_body is not None:
+                self.physics_world.transform_rows[last.physics_body._index] = index
+        
+        del self.entity_map[entity.id]
+        self._unindex_name(entity)
+        entity.scene = None
+        self.version += 1
     
     def find_entity_by_name(self, name: str) -> Optional[Entity]:
-        """Find an entity by name"""
-        for entity in self.entities:
-            if entity.name == name:
-                return entity
-        return None
+        """Find an entity by name (the earliest added one if several match)"""
+        entities = self._by_name.get(name)
+        if not entities:
+            return None
+        return next(iter(entities.values()))
+    
+    def _component_added(self, entity: Entity, component):
+        """Register a component of an entity in this scene"""
+        self.version += 1
+        if component is entity.physics_body:
+            self.physics_world.add(component, self._index_of[entity.id])
+        elif component is entity.renderable:
+            self._renderable_changed(entity)
+        
+        update = getattr(type(component), 'update', None)
+        if callable(update) and update is not Component.update:
+            self._updatable_components[id(component)] = (entity, component)
+    
+    def _component_removed(self, entity: Entity, component):
+        """Unregister a component that is leaving an entity in this scene"""
+        self.version += 1
+        if isinstance(component, PhysicsBody) and component._world is self.physics_world:
+            self.physics_world.release(component)
+        elif isinstance(component, Renderable):
+            # Entities being removed are already unindexed; their row is
+            # overwritten or reset anyway
+            index = self._index_of.get(entity.id)
+            if index is not None:
+                self.visible_mask[index] = False
+                self.mesh_ids[index] = -1
+        self._updatable_components.pop(id(component), None)
+    
+    def _activity_changed(self, entity: Entity):
+        """Track an entity of this scene being activated or deactivated"""
+        self.version += 1
+        self.active_mask[self._index_of[entity.id]] = entity.active
+    
+    def _renderable_changed(self, entity: Entity):
+        """Refresh the render state of an entity whose Renderable was added or modified"""
+        self.version += 1
+        renderable = entity.renderable
+        index = self._index_of[entity.id]
+        self.visible_mask[index] = renderable.visible
+        self.mesh_ids[index] = self.mesh_id(renderable.mesh)
+    
+    def mesh_id(self, mesh) -> int:
+        """Get the ID of a mesh in this scene, registering it if needed"""
+        mesh_id = self._mesh_index.get(id(mesh))
+        if mesh_id is None:
+            mesh_id = len(self.meshes)
+            self.meshes.append(mesh)  # Also keeps id(mesh) from being reused
+            self._mesh_index[id(mesh)] = mesh_id
+        return mesh_id
+    
+    def _init_row(self, index: int, entity: Entity):
+        """Reset the per-row render state for an entity being added"""
+        self.active_mask[index] = entity.active
+        self.visible_mask[index] = False
+        self.mesh_ids[index] = -1
+    
+    def _reserve_rows(self, capacity: int):
+        """Grow the per-row render state to hold at least ``capacity`` rows"""
+        if capacity <= len(self.mesh_ids):
+            return
+        capacity = max(capacity, 2 * len(self.mesh_ids))
+        n = len(self.entities)
+        
+        active_mask = np.zeros(capacity, dtype=np.bool_)
+        visible_mask = np.zeros(capacity, dtype=np.bool_)
+        mesh_ids = np.full(capacity, -1, dtype=np.int32)
+        active_mask[:n] = self.active_mask[:n]
+        visible_mask[:n] = self.visible_mask[:n]
+        mesh_ids[:n] = self.mesh_ids[:n]
+        
+        self.active_mask = active_mask
+        self.visible_mask = visible_mask
+        self.mesh_ids = mesh_ids
+    
+    def _index_name(self, entity: Entity):
+        self._by_name.setdefault(entity.name, {})[entity.id] = entity
+    
+    def _unindex_name(self, entity: Entity):
+        entities = self._by_name[entity.name]
+        del entities[entity.id]
+        if not entities:
+            del self._by_name[entity.name]
     
     def update(self, dt: float):
         """Update all entities in the scene"""
-        for entity in self.entities[:]:  # Copy list to allow removal during iteration
-            if entity.active:
-                for component in entity.components.values():
-                    if hasattr(component, 'update'):
-                        component.update(dt)
+        # Copy to allow adding/removing components during iteration
+        for entity, component in list(self._updatable_components.values()):
+            if entity.active and getattr(component, 'active', True):
+                component.update(dt)
+        
+        # Integrate all physics bodies straight into the transform positions.
+        # Matrices are not rebuilt here: renderers build the rows they draw
+        # (see collect_transforms) and get_matrix() rebuilds dirty ones
+        self.physics_world.integrate(dt, self.transforms)
+    
+    def update_transforms(self):
+        """Rebuild the model matrices of all entities in one batched pass"""
+        self.transforms.update_matrices()
+    
+    def collect_transforms(self, rows: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """Write the model matrices of the entities at ``rows`` into ``out``
+        
+        ``rows`` are indices into self.entities and ``out`` must have shape
+        (len(rows), 4, 4). The matrices are built straight from the transform
+        storage in one batched pass, so they are current even if the cached
+        ones are stale.
+        """
+        transforms = self.transforms
+        gather_matrices(transforms.positions, transforms.rotations, transforms.scales, rows, out)
+        return out
 
 
 class Camera:
@@ -4,18 +4,24 @@ Implements Voronoi-based fracture patterns and rigid body breakage
 """
 import numpy as np
 from typing import List, Tuple
-from scipy.spatial import Voronoi
+from scipy.spatial import cKDTree
 from ..core.component import PhysicsBody, Transform
 
 
 class FractureSystem:
     """System for handling object fracture and destruction"""
     
-    def __init__(self):
+    def __init__(self, probe_resolution: int = 10):
         self.voronoi_points = []
         
+        # Regular lattice of probe cell centers in the unit cube, used to
+        # sample Voronoi cells (probe_resolution per axis)
+        self.probe_resolution = probe_resolution
+        lattice = np.indices((probe_resolution,) * 3).reshape(3, -1).T
+        self._unit_probes = (lattice + 0.5) / probe_resolution
+        
     def fracture_object(self, position: np.ndarray, size: np.ndarray, 
-                       fracture_points: List[np.ndarray], 
+                       fracture_points: np.ndarray, 
                        material_strength: float = 100.0) -> List:
         """
         Fracture an object using Voronoi tessellation
@@ -23,7 +29,7 @@ class FractureSystem:
         Args:
             position: World position of the object
             size: Size of the object (for bounding box)
-            fracture_points: Points where fracture originates
+            fracture_points: Points where fracture originates (sequence or (K, 3) array)
             material_strength: Material strength parameter
             
         Returns:
@@ -38,81 +44,81 @@ class FractureSystem:
         return fractured_pieces
     
     def _generate_voronoi_fracture(self, position: np.ndarray, size: np.ndarray, 
-                                  fracture_points: List[np.ndarray]) -> List:
-        """Generate fracture pattern using Voronoi tessellation"""
-        # Create bounding box for the object
+                                  fracture_points: np.ndarray) -> List:
+        """Generate fracture pattern using a sampled 3D Voronoi partition
+        
+        Pieces are axis-aligned boxes, so the exact cell polygons are never
+        needed: the object is divided into a regular lattice of probe cells,
+        each labelled with its nearest seed, and each piece is the bounding
+        box of the probe cells of one seed. Voronoi cells are not boxes, so
+        neighboring pieces overlap; each piece's ``'volume'`` is that of its
+        probe cells (the sampled cell volume), not of its box.
+        """
+        # Corner of the object's bounding box
         min_corner = position - size / 2
-        max_corner = position + size / 2
         
         # Add the fracture points and some random points for realistic fracture
-        all_points = fracture_points.copy()
-        
-        # Add random points for more natural fracture patterns
-        for _ in range(5):  # Add 5 random points
-            random_offset = np.random.uniform(-0.3, 0.3, 3) * size
-            all_points.append(position + random_offset)
-        
-        # Generate 3D Voronoi by creating 2D Voronoi on each plane and stacking
-        points_2d = np.array([[p[0], p[2]] for p in all_points])  # XZ plane
-        vor = Voronoi(points_2d)
-        
-        # Convert Voronoi regions to 3D pieces
-        pieces = []
-        for region_idx in vor.regions:
-            if len(region_idx) == 0 or -1 in region_idx:
-                continue
-                
-            # Get vertices of the region
-            vertices = vor.vertices[region_idx]
-            
-            # Create a 3D bounding box for this piece
-            if len(vertices) > 0:
-                min_x, min_z = vertices.min(axis=0)
-                max_x, max_z = vertices.max(axis=0)
-                
-                # Extrude in Y direction (height of original object)
-                piece_min = np.array([min_x, min_corner[1], min_z])
-                piece_max = np.array([max_x, max_corner[1], max_z])
-                
-                piece_center = (piece_min + piece_max) / 2
-                piece_size = piece_max - piece_min
-                
-                pieces.append({
-                    'position': piece_center,
-                    'size': piece_size,
-                    'volume': np.prod(piece_size)
-                })
-        
-        return pieces
+        random_points = position + np.random.uniform(-0.3, 0.3, (5, 3)) * size  # Add 5 random points
+        all_points = np.concatenate([np.asarray(fracture_points).reshape(-1, 3), random_points])
+        
+        # Label every probe with its nearest seed (i.e. its Voronoi cell)
+        probes = min_corner + self._unit_probes * size
+        _, labels = cKDTree(all_points).query(probes)
+        
+        # Group probes by cell and take per-cell bounds in one pass
+        order = np.argsort(labels, kind='stable')
+        labels = labels[order]
+        probes = probes[order]
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        half_step = size / (2 * self.probe_resolution)
+        piece_min = np.minimum.reduceat(probes, starts, axis=0) - half_step
+        piece_max = np.maximum.reduceat(probes, starts, axis=0) + half_step
+        
+        piece_centers = (piece_min + piece_max) / 2
+        piece_sizes = piece_max - piece_min
+        probe_counts = np.diff(np.r_[starts, len(labels)])
+        piece_volumes = probe_counts * (np.prod(size) / self.probe_resolution**3)
+        
+        return [
+            {
+                'position': piece_centers[i],
+                'size': piece_sizes[i],
+                'volume': piece_volumes[i]
+            }
+            for i in range(len(starts))
+        ]
     
     def _calculate_fracture_pieces(self, pieces: List, material_strength: float) -> List:
         """Calculate which pieces break off based on stress distribution"""
-        fractured_pieces = []
+        volumes = np.fromiter((piece['volume'] for piece in pieces), dtype=np.float32,
+                              count=len(pieces))
+        
+        # Random factor to make fracture more natural
+        random_factors = np.random.uniform(0.5, 1.5, len(pieces))
         
-        for piece in pieces:
-            # Calculate if this piece should break off based on size and stress
-            volume = piece['volume']
-            stress_threshold = material_strength * volume  # Simplified model
+        # If piece is small enough, it breaks off
+        breaks = (volumes < 0.1) | ((volumes < 0.5) & (random_factors < 1.0))
+        broken = np.flatnonzero(breaks)
+        
+        # Add some initial velocity based on fracture force
+        velocities = np.random.uniform(-2, 2, (len(broken), 3))
+        
+        fractured_pieces = []
+        for idx, velocity in zip(broken, velocities):
+            piece = pieces[idx]
             
-            # Random factor to make fracture more natural
-            random_factor = np.random.uniform(0.5, 1.5)
+            # Create physics body for this piece
+            physics_body = PhysicsBody(
+                mass=volumes[idx] * 1000,  # Assuming density of 1000 kg/m^3
+                is_static=False
+            )
+            physics_body.velocity = velocity
             
-            # If piece is small enough, it breaks off
-            if volume < 0.1 or (volume < 0.5 and random_factor < 1.0):
-                # Create physics body for this piece
-                physics_body = PhysicsBody(
-                    mass=volume * 1000,  # Assuming density of 1000 kg/m^3
-                    is_static=False
-                )
-                
-                # Add some initial velocity based on fracture force
-                physics_body.velocity = np.random.uniform(-2, 2, 3)
-                
-                fractured_pieces.append({
-                    'transform': Transform(position=piece['position']),
-                    'physics_body': physics_body,
-                    'size': piece['size']
-                })
+            fractured_pieces.append({
+                'transform': Transform(position=piece['position']),
+                'physics_body': physics_body,
+                'size': piece['size']
+            })
         
         return fractured_pieces
 
@@ -137,13 +143,10 @@ class DestructibleCube:
     
     def _fracture(self, impact_position: np.ndarray):
         """Fracture the cube at the impact position"""
-        # Calculate fracture points around the impact
-        fracture_points = [impact_position]
-        
-        # Add some additional fracture points for more realistic breakage
-        for _ in range(3):
-            offset = np.random.uniform(-0.2, 0.2, 3) * self.size
-            fracture_points.append(impact_position + offset)
+        # Calculate fracture points around the impact, plus some additional
+        # fracture points for more realistic breakage
+        offsets = np.random.uniform(-0.2, 0.2, (3, 3)) * self.size
+        fracture_points = np.vstack([impact_position, impact_position + offsets])
         
         # Generate fragments
         self.fragments = self.fracture_system.fracture_object(
@@ -2,9 +2,10 @@
 SPH (Smoothed Particle Hydrodynamics) fluid simulation system
 Uses Numba for JIT compilation to accelerate physics calculations
 """
+import math
 import numpy as np
 import numba
-from numba import jit, prange
+from numba import njit, prange, void, float32 as f4, int32 as i4, int64 as i8
 from typing import Tuple
 
 
@@ -23,183 +24,446 @@ class SPHSystem:
         self.rest_density = rest_density
         self.viscosity = viscosity
         self.pressure_stiffness = pressure_stiffness
-        self.gravity = np.array(gravity or [0.0, -9.81, 0.0], dtype=np.float32)
+        self.gravity = np.array([0.0, -9.81, 0.0] if gravity is None else gravity, dtype=np.float32)
         
-        # Initialize particle data using Structure of Arrays (SoA) for performance
-        self.positions = np.random.uniform(-1.0, 1.0, (particle_count, 3)).astype(np.float32)
-        self.velocities = np.zeros((particle_count, 3), dtype=np.float32)
+        # Initialize particle data using Structure of Arrays (SoA) for performance.
+        # Each vector quantity is a (3, N) block whose rows are the contiguous
+        # per-axis arrays the kernels work on (pos_x, pos_y, pos_z, ...)
+        self._position_block = np.ascontiguousarray(
+            np.random.uniform(-1.0, 1.0, (particle_count, 3)).astype(np.float32).T
+        )
+        self._velocity_block = np.zeros((3, particle_count), dtype=np.float32)
+        self._force_block = np.zeros((3, particle_count), dtype=np.float32)
+        self.pos_x, self.pos_y, self.pos_z = self._position_block
+        self.vel_x, self.vel_y, self.vel_z = self._velocity_block
+        self.force_x, self.force_y, self.force_z = self._force_block
         self.densities = np.full(particle_count, rest_density, dtype=np.float32)
         self.pressures = np.zeros(particle_count, dtype=np.float32)
-        self.forces = np.zeros((particle_count, 3), dtype=np.float32)
         
         # Boundary parameters
         self.boundary_min = np.array([-3.0, -1.0, -3.0], dtype=np.float32)
         self.boundary_max = np.array([3.0, 5.0, 3.0], dtype=np.float32)
         self.boundary_damping = -0.5
         
-        # Precompute constants
+        # Precompute constants so the kernels only see plain scalars
         self.kernel_constant = 8.0 / (np.pi * smoothing_radius**4)
+        self.gradient_constant = 24.0 / (np.pi * smoothing_radius**5)
+        self.inv_smoothing_radius = 1.0 / smoothing_radius
         self.pressure_constant = pressure_stiffness * rest_density
         
+        self._init_solver()
+    
+    def _init_solver(self):
+        """Allocate the state the CPU solver needs beyond the particles themselves
+        
+        Other backends override this with their own setup.
+        """
+        particle_count = self.particle_count
+        
+        # Uniform spatial grid with cell size h, rebuilt every step so each
+        # particle only has to visit the 27 cells around its own
+        self.grid_dims = np.ceil(
+            (self.boundary_max - self.boundary_min) / self.smoothing_radius
+        ).astype(np.int32)
+        cell_count = int(np.prod(self.grid_dims))
+        self.cell_of_particle = np.zeros(particle_count, dtype=np.int32)
+        self.sorted_indices = np.arange(particle_count, dtype=np.int64)
+        self.cell_start = np.zeros(cell_count, dtype=np.int32)
+        self.cell_end = np.zeros(cell_count, dtype=np.int32)
+        
+        # Each pair is visited once and scattered to both particles, so every
+        # parallel chunk accumulates into its own private row to avoid races.
+        # Rows are summed (and re-zeroed) by the kernels after the pair sweep
+        self.chunk_count = numba.get_num_threads()
+        self._density_scratch = np.zeros((self.chunk_count, particle_count), dtype=np.float32)
+        self._force_scratch = np.zeros((3, self.chunk_count, particle_count), dtype=np.float32)
+        
+        # Neighbors found by the density sweep, replayed by the force sweep so
+        # the grid walk and distance rejection only happen once per step.
+        # Grows on demand when a particle has more neighbors than fit
+        self.max_neighbors = 64
+        self.neighbor_counts = np.zeros(particle_count, dtype=np.int32)
+        self.neighbor_lists = np.zeros((particle_count, self.max_neighbors), dtype=np.int32)
+    
+    @property
+    def positions(self) -> np.ndarray:
+        """(N, 3) view of particle positions"""
+        return self._position_block.T
+    
+    @property
+    def velocities(self) -> np.ndarray:
+        """(N, 3) view of particle velocities"""
+        return self._velocity_block.T
+    
+    @property
+    def forces(self) -> np.ndarray:
+        """(N, 3) view of the particle forces from the last step"""
+        return self._force_block.T
+        
     def update(self, dt: float):
         """Update the SPH simulation"""
-        # Calculate densities and pressures
-        calculate_densities_and_pressures(
-            self.positions, 
-            self.densities, 
-            self.pressures,
+        # Bin particles into the spatial grid (shared by both neighbor sweeps)
+        build_spatial_grid(
+            self.pos_x,
+            self.pos_y,
+            self.pos_z,
+            self.boundary_min,
             self.smoothing_radius,
-            self.rest_density,
-            self.pressure_constant,
+            self.grid_dims,
+            self.cell_of_particle,
+            self.sorted_indices,
+            self.cell_start,
+            self.cell_end,
             self.particle_count
         )
         
-        # Calculate forces
-        calculate_forces(
-            self.positions,
-            self.velocities, 
-            self.densities,
-            self.pressures,
-            self.forces,
-            self.smoothing_radius,
-            self.viscosity,
-            self.kernel_constant,
-            self.gravity,
-            self.particle_count
-        )
+        gravity_x, gravity_y, gravity_z = self.gravity
+        
+        # Calculate densities, pressures and forces in one fused kernel
+        while True:
+            required = sph_step(
+                self.pos_x,
+                self.pos_y,
+                self.pos_z,
+                self.vel_x,
+                self.vel_y,
+                self.vel_z,
+                self.densities,
+                self.pressures,
+                self.force_x,
+                self.force_y,
+                self.force_z,
+                self.smoothing_radius,
+                self.inv_smoothing_radius,
+                self.kernel_constant,
+                self.gradient_constant,
+                self.rest_density,
+                self.pressure_constant,
+                self.viscosity,
+                gravity_x,
+                gravity_y,
+                gravity_z,
+                self.grid_dims,
+                self.cell_of_particle,
+                self.sorted_indices,
+                self.cell_start,
+                self.cell_end,
+                self.neighbor_counts,
+                self.neighbor_lists,
+                self._density_scratch,
+                self._force_scratch,
+                self.chunk_count,
+                self.particle_count
+            )
+            if required <= self.max_neighbors:
+                break
+            
+            # Neighbor lists overflowed; grow them and redo the step
+            while self.max_neighbors < required:
+                self.max_neighbors *= 2
+            self.neighbor_lists = np.zeros(
+                (self.particle_count, self.max_neighbors), dtype=np.int32
+            )
         
         # Integrate motion
         integrate_motion(
-            self.positions,
-            self.velocities,
-            self.forces,
+            self.pos_x,
+            self.pos_y,
+            self.pos_z,
+            self.vel_x,
+            self.vel_y,
+            self.vel_z,
+            self.force_x,
+            self.force_y,
+            self.force_z,
             dt,
             self.boundary_min,
             self.boundary_max,
             self.boundary_damping,
             self.particle_count
         )
-        
-        # Clear forces for next frame
-        self.forces.fill(0.0)
 
 
-@jit(nopython=True, parallel=True)
-def calculate_densities_and_pressures(positions, densities, pressures, smoothing_radius, 
-                                   rest_density, pressure_constant, particle_count):
-    """Calculate density and pressure for each particle using SPH kernel"""
-    h = smoothing_radius
-    h_sq = h * h
+
+# Explicit kernel signatures. Kernels compile eagerly at import (and are
+# cached on disk), and the C-contiguous layouts let LLVM vectorize the loops
+_f4_1d = f4[::1]
+_i4_1d = i4[::1]
+
+BUILD_SPATIAL_GRID_SIG = void(
+    _f4_1d, _f4_1d, _f4_1d,              # pos_x, pos_y, pos_z
+    _f4_1d, f4, _i4_1d,                  # boundary_min, cell_size, grid_dims
+    _i4_1d, i8[::1], _i4_1d, _i4_1d,     # cell_of_particle, sorted_indices, cell_start, cell_end
+    i8                                   # particle_count
+)
+
+SPH_STEP_SIG = i8(
+    _f4_1d, _f4_1d, _f4_1d,              # pos_x, pos_y, pos_z
+    _f4_1d, _f4_1d, _f4_1d,              # vel_x, vel_y, vel_z
+    _f4_1d, _f4_1d,                      # densities, pressures
+    _f4_1d, _f4_1d, _f4_1d,              # force_x, force_y, force_z
+    f4, f4, f4, f4,                      # smoothing_radius, inv_smoothing_radius, kernel/gradient constants
+    f4, f4, f4,                          # rest_density, pressure_constant, viscosity
+    f4, f4, f4,                          # gravity_x, gravity_y, gravity_z
+    _i4_1d, _i4_1d, i8[::1],             # grid_dims, cell_of_particle, sorted_indices
+    _i4_1d, _i4_1d,                      # cell_start, cell_end
+    _i4_1d, i4[:, ::1],                  # neighbor_counts, neighbor_lists
+    f4[:, ::1], f4[:, :, ::1],           # density_scratch, force_scratch
+    i8, i8                               # chunk_count, particle_count
+)
+
+INTEGRATE_MOTION_SIG = void(
+    _f4_1d, _f4_1d, _f4_1d,              # pos_x, pos_y, pos_z
+    _f4_1d, _f4_1d, _f4_1d,              # vel_x, vel_y, vel_z
+    _f4_1d, _f4_1d, _f4_1d,              # force_x, force_y, force_z
+    f4, _f4_1d, _f4_1d, f4,              # dt, boundary_min, boundary_max, boundary_damping
+    i8                                   # particle_count
+)
+
+
+@njit(BUILD_SPATIAL_GRID_SIG, parallel=True, fastmath=True, boundscheck=False,
+      error_model='numpy', cache=True, nogil=True)
+def build_spatial_grid(pos_x, pos_y, pos_z, boundary_min, cell_size, grid_dims, cell_of_particle,
+                       sorted_indices, cell_start, cell_end, particle_count):
+    """Bin particles into a uniform grid and build per-cell index ranges
     
+    After this call the particles of cell ``c`` are
+    ``sorted_indices[cell_start[c]:cell_end[c]]``.
+    """
+    nx, ny, nz = grid_dims[0], grid_dims[1], grid_dims[2]
+    inv_cell_size = 1.0 / cell_size
+    
+    # Hash every particle to its (clamped) cell
     for i in prange(particle_count):
-        density = 0.0
-        
-        for j in range(particle_count):
-            if i == j:
-                continue
-                
-            # Calculate distance between particles
-            dx = positions[i, 0] - positions[j, 0]
-            dy = positions[i, 1] - positions[j, 1] 
-            dz = positions[i, 2] - positions[j, 2]
-            dist_sq = dx*dx + dy*dy + dz*dz
-            
-            if dist_sq < h_sq:
-                r = np.sqrt(dist_sq)
-                # Cubic spline kernel
-                q = r / h
-                if q <= 1.0:
-                    if q <= 0.5:
-                        kernel_value = 8.0 / (np.pi * h**4) * (1 - 6*q*q + 6*q*q*q)
-                    else:
-                        kernel_value = 8.0 / (np.pi * h**4) * 2 * (1 - q)**3
-                    density += kernel_value
-        
-        densities[i] = max(density, rest_density * 0.1)  # Prevent division by zero
-        pressures[i] = pressure_constant * (densities[i] / rest_density - 1.0)
+        ix = min(max(int((pos_x[i] - boundary_min[0]) * inv_cell_size), 0), nx - 1)
+        iy = min(max(int((pos_y[i] - boundary_min[1]) * inv_cell_size), 0), ny - 1)
+        iz = min(max(int((pos_z[i] - boundary_min[2]) * inv_cell_size), 0), nz - 1)
+        cell_of_particle[i] = (iz * ny + iy) * nx + ix
+    
+    # Sort particle indices by cell
+    sorted_indices[:] = np.argsort(cell_of_particle)
+    
+    # Mark where each cell's run starts and ends in the sorted order
+    cell_start[:] = 0
+    cell_end[:] = 0
+    for k in prange(particle_count):
+        cell = cell_of_particle[sorted_indices[k]]
+        if k == 0 or cell_of_particle[sorted_indices[k - 1]] != cell:
+            cell_start[cell] = k
+        if k == particle_count - 1 or cell_of_particle[sorted_indices[k + 1]] != cell:
+            cell_end[cell] = k + 1
 
 
-@jit(nopython=True, parallel=True)
-def calculate_forces(positions, velocities, densities, pressures, forces, 
-                    smoothing_radius, viscosity, kernel_constant, gravity, particle_count):
-    """Calculate forces on each particle (pressure, viscosity, external forces)"""
+@njit(SPH_STEP_SIG, parallel=True, fastmath=True, boundscheck=False,
+      error_model='numpy', cache=True, nogil=True)
+def sph_step(pos_x, pos_y, pos_z, vel_x, vel_y, vel_z, densities, pressures,
+             force_x, force_y, force_z, smoothing_radius, inv_smoothing_radius,
+             kernel_constant, gradient_constant, rest_density, pressure_constant,
+             viscosity, gravity_x, gravity_y, gravity_z, grid_dims, cell_of_particle,
+             sorted_indices, cell_start, cell_end, neighbor_counts, neighbor_lists,
+             density_scratch, force_scratch, chunk_count, particle_count):
+    """Calculate density, pressure and forces for each particle
+    
+    Each neighbor pair is evaluated once (from the particle that comes first
+    in cell order) and scattered to both particles. The density sweep walks
+    the grid and records every pair it finds in ``neighbor_lists``; once all
+    densities and pressures are known, the force sweep replays those lists
+    instead of walking the grid again.
+    
+    Forces (including gravity) are written, not accumulated, so the force
+    arrays need no clearing between steps.
+    
+    Returns the largest neighbor count seen. If it exceeds the width of
+    ``neighbor_lists`` the force sweep is skipped and the caller must grow
+    the lists and call again.
+    """
+    if particle_count == 0:
+        return 0
+    
     h = smoothing_radius
     h_sq = h * h
+    nx, ny, nz = grid_dims[0], grid_dims[1], grid_dims[2]
+    max_neighbors = neighbor_lists.shape[1]
+    chunk_size = (particle_count + chunk_count - 1) // chunk_count
     
+    # Density sweep: walk particles in cell order so neighbors stay hot in cache
+    for t in prange(chunk_count):
+        local_density = density_scratch[t]
+        
+        for k in range(t * chunk_size, min((t + 1) * chunk_size, particle_count)):
+            i = sorted_indices[k]
+            count = 0
+            
+            cell = cell_of_particle[i]
+            ix = cell % nx
+            iy = (cell // nx) % ny
+            iz = cell // (nx * ny)
+            
+            for oz in range(-1, 2):
+                cz = iz + oz
+                if cz < 0 or cz >= nz:
+                    continue
+                for oy in range(-1, 2):
+                    cy = iy + oy
+                    if cy < 0 or cy >= ny:
+                        continue
+                    for ox in range(-1, 2):
+                        cx = ix + ox
+                        if cx < 0 or cx >= nx:
+                            continue
+                        neighbor_cell = (cz * ny + cy) * nx + cx
+                        
+                        # Only pairs with j after i in sorted order; (j, i) is the same pair
+                        for n in range(max(cell_start[neighbor_cell], k + 1), cell_end[neighbor_cell]):
+                            j = sorted_indices[n]
+                                
+                            # Calculate distance between particles
+                            dx = pos_x[i] - pos_x[j]
+                            dy = pos_y[i] - pos_y[j] 
+                            dz = pos_z[i] - pos_z[j]
+                            dist_sq = dx*dx + dy*dy + dz*dz
+                            
+                            if dist_sq < h_sq:
+                                if count < max_neighbors:
+                                    neighbor_lists[i, count] = j
+                                count += 1
+                                
+                                r = math.sqrt(dist_sq)
+                                # Cubic spline kernel
+                                q = r * inv_smoothing_radius
+                                if q <= 1.0:
+                                    if q <= 0.5:
+                                        kernel_value = kernel_constant * (1.0 - 6.0*q*q + 6.0*q*q*q)
+                                    else:
+                                        omq = 1.0 - q
+                                        kernel_value = 2.0 * kernel_constant * omq*omq*omq
+                                    local_density[i] += kernel_value
+                                    local_density[j] += kernel_value
+            
+            neighbor_counts[i] = count
+    
+    # Reduce the per-chunk densities and derive pressures
     for i in prange(particle_count):
-        # Add gravity force
-        forces[i, 1] += gravity[1]  # Only Y component for now
+        density = 0.0
+        for t in range(chunk_count):
+            density += density_scratch[t, i]
+            density_scratch[t, i] = 0.0
         
-        pressure_force = np.array([0.0, 0.0, 0.0], dtype=numba.float32)
-        viscosity_force = np.array([0.0, 0.0, 0.0], dtype=numba.float32)
+        densities[i] = max(density, rest_density * 0.1)  # Prevent division by zero
+        pressures[i] = pressure_constant * (densities[i] / rest_density - 1.0)
+    
+    required = neighbor_counts.max()
+    if required > max_neighbors:
+        return required
+    
+    # Force sweep over the recorded neighbor lists. The kernel gradient is
+    # antisymmetric, so the distance and gradient are shared while each
+    # particle receives its own pressure/viscosity term (weighted by the
+    # other particle's density)
+    for t in prange(chunk_count):
+        local_fx = force_scratch[0, t]
+        local_fy = force_scratch[1, t]
+        local_fz = force_scratch[2, t]
         
-        for j in range(particle_count):
-            if i == j:
-                continue
-                
-            # Calculate distance between particles
-            dx = positions[i, 0] - positions[j, 0]
-            dy = positions[i, 1] - positions[j, 1]
-            dz = positions[i, 2] - positions[j, 2]
-            dist_sq = dx*dx + dy*dy + dz*dz
+        for k in range(t * chunk_size, min((t + 1) * chunk_size, particle_count)):
+            i = sorted_indices[k]
             
-            if dist_sq < h_sq:
-                r = np.sqrt(dist_sq)
+            for n in range(neighbor_counts[i]):
+                j = neighbor_lists[i, n]
                 
-                # Compute gradient of kernel
+                dx = pos_x[i] - pos_x[j]
+                dy = pos_y[i] - pos_y[j]
+                dz = pos_z[i] - pos_z[j]
+                r = math.sqrt(dx*dx + dy*dy + dz*dz)
+                
+                # Compute gradient of kernel (cubic spline)
                 if r > 1e-8:  # Prevent division by zero
-                    grad_kernel = compute_kernel_gradient(dx, dy, dz, r, h)
+                    q = r * inv_smoothing_radius
+                    if q <= 0.5:
+                        grad_mag = gradient_constant * q * (3.0 * q - 2.0)
+                    else:
+                        omq = 1.0 - q
+                        grad_mag = -gradient_constant * omq*omq
+                    
+                    # Normalize and scale by gradient magnitude
+                    grad_scale = grad_mag / r
+                    gx = dx * grad_scale
+                    gy = dy * grad_scale
+                    gz = dz * grad_scale
                     
-                    # Pressure force
-                    pressure_term = (pressures[i] + pressures[j]) / (2.0 * densities[j])
-                    pressure_force -= grad_kernel * pressure_term
+                    # Pressure term shared by both particles
+                    pressure_term = (pressures[i] + pressures[j]) * 0.5
+                    dvx = viscosity * (vel_x[j] - vel_x[i])
+                    dvy = viscosity * (vel_y[j] - vel_y[i])
+                    dvz = viscosity * (vel_z[j] - vel_z[i])
                     
-                    # Viscosity force
-                    vel_diff = velocities[j] - velocities[i]
-                    viscosity_force += viscosity * vel_diff * (grad_kernel / densities[j])
+                    # Pressure + viscosity force on i (gradient g)
+                    inv_density_j = 1.0 / densities[j]
+                    local_fx[i] += gx * (dvx - pressure_term) * inv_density_j
+                    local_fy[i] += gy * (dvy - pressure_term) * inv_density_j
+                    local_fz[i] += gz * (dvz - pressure_term) * inv_density_j
+                    
+                    # ... and on j (gradient -g)
+                    inv_density_i = 1.0 / densities[i]
+                    local_fx[j] += gx * (dvx + pressure_term) * inv_density_i
+                    local_fy[j] += gy * (dvy + pressure_term) * inv_density_i
+                    local_fz[j] += gz * (dvz + pressure_term) * inv_density_i
+    
+    # Reduce the per-chunk contributions and add gravity
+    for i in prange(particle_count):
+        fx = gravity_x
+        fy = gravity_y
+        fz = gravity_z
+        for t in range(chunk_count):
+            fx += force_scratch[0, t, i]
+            fy += force_scratch[1, t, i]
+            fz += force_scratch[2, t, i]
+            force_scratch[0, t, i] = 0.0
+            force_scratch[1, t, i] = 0.0
+            force_scratch[2, t, i] = 0.0
         
-        # Apply forces
-        forces[i] += pressure_force
-        forces[i] += viscosity_force
-
-
-@jit(nopython=True)
-def compute_kernel_gradient(dx, dy, dz, r, h):
-    """Compute gradient of cubic spline kernel"""
-    q = r / h
-    h_inv = 1.0 / h
-    
-    if q <= 0.5:
-        grad_mag = 24.0 / (np.pi * h**5) * q * (3.0 * q - 2.0)
-    else:
-        grad_mag = 24.0 / (np.pi * h**5) * (1.0 - q)**2
-        grad_mag = -grad_mag if q > 1e-8 else 0.0
-    
-    # Normalize and scale by gradient magnitude
-    if r > 1e-8:
-        return np.array([dx/r * grad_mag, dy/r * grad_mag, dz/r * grad_mag], dtype=numba.float32)
-    else:
-        return np.array([0.0, 0.0, 0.0], dtype=numba.float32)
+        # Plain stores: forces are fully rewritten every step, so no clearing pass
+        force_x[i] = fx
+        force_y[i] = fy
+        force_z[i] = fz
+    
+    return required
 
 
-@jit(nopython=True)
-def integrate_motion(positions, velocities, forces, dt, boundary_min, boundary_max, boundary_damping, particle_count):
+@njit(INTEGRATE_MOTION_SIG, parallel=True, fastmath=True, boundscheck=False,
+      error_model='numpy', cache=True, nogil=True)
+def integrate_motion(pos_x, pos_y, pos_z, vel_x, vel_y, vel_z, force_x, force_y, force_z,
+                     dt, boundary_min, boundary_max, boundary_damping, particle_count):
     """Integrate particle motion using Verlet integration"""
-    for i in range(particle_count):
-        # Apply forces to acceleration
-        acceleration = forces[i]  # Forces already include gravity
-        
-        # Update velocity
-        velocities[i] += acceleration * dt
+    for i in prange(particle_count):
+        # Update velocity (forces already include gravity)
+        vel_x[i] += force_x[i] * dt
+        vel_y[i] += force_y[i] * dt
+        vel_z[i] += force_z[i] * dt
         
         # Update position
-        positions[i] += velocities[i] * dt
+        pos_x[i] += vel_x[i] * dt
+        pos_y[i] += vel_y[i] * dt
+        pos_z[i] += vel_z[i] * dt
         
         # Boundary collision handling
-        for j in range(3):  # X, Y, Z axes
-            if positions[i, j] < boundary_min[j]:
-                positions[i, j] = boundary_min[j]
-                velocities[i, j] *= boundary_damping
-            elif positions[i, j] > boundary_max[j]:
-                positions[i, j] = boundary_max[j]
-                velocities[i, j] *= boundary_damping
\ No newline at end of file
+        if pos_x[i] < boundary_min[0]:
+            pos_x[i] = boundary_min[0]
+            vel_x[i] *= boundary_damping
+        elif pos_x[i] > boundary_max[0]:
+            pos_x[i] = boundary_max[0]
+            vel_x[i] *= boundary_damping
+        
+        if pos_y[i] < boundary_min[1]:
+            pos_y[i] = boundary_min[1]
+            vel_y[i] *= boundary_damping
+        elif pos_y[i] > boundary_max[1]:
+            pos_y[i] = boundary_max[1]
+            vel_y[i] *= boundary_damping
+        
+        if pos_z[i] < boundary_min[2]:
+            pos_z[i] = boundary_min[2]
+            vel_z[i] *= boundary_damping
+        elif pos_z[i] > boundary_max[2]:
+            pos_z[i] = boundary_max[2]
+            vel_z[i] *= boundary_damping
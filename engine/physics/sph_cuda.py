@@ -0,0 +1,329 @@
+"""
+GPU backend for the SPH fluid simulation
+Runs the SPH step as Numba CUDA kernels with particle state resident on the device
+"""
+import math
+import numpy as np
+from numba import cuda, float32 as f4
+from .sph import SPHSystem
+
+
+# Threads per block; also the width of the shared-memory tiles
+THREADS_PER_BLOCK = 128
+
+
+class CudaSPHSystem(SPHSystem):
+    """SPH system whose particle state lives on the GPU
+
+    Takes the same parameters as SPHSystem. Positions, velocities, densities
+    and pressures stay in device memory between steps; ``positions`` and
+    friends download on access, so only read them when the data is needed
+    on the host (e.g. for rendering).
+    """
+    def _init_solver(self):
+        """Upload particle state to the device instead of allocating the CPU solver's scratch"""
+        self.d_pos_x = cuda.to_device(self.pos_x)
+        self.d_pos_y = cuda.to_device(self.pos_y)
+        self.d_pos_z = cuda.to_device(self.pos_z)
+        self.d_vel_x = cuda.to_device(self.vel_x)
+        self.d_vel_y = cuda.to_device(self.vel_y)
+        self.d_vel_z = cuda.to_device(self.vel_z)
+        self.d_force_x = cuda.device_array(self.particle_count, dtype=np.float32)
+        self.d_force_y = cuda.device_array(self.particle_count, dtype=np.float32)
+        self.d_force_z = cuda.device_array(self.particle_count, dtype=np.float32)
+        self.d_densities = cuda.to_device(self.densities)
+        self.d_pressures = cuda.to_device(self.pressures)
+
+        self.blocks_per_grid = (self.particle_count + THREADS_PER_BLOCK - 1) // THREADS_PER_BLOCK
+
+    @property
+    def positions(self) -> np.ndarray:
+        """(N, 3) host copy of particle positions"""
+        self.d_pos_x.copy_to_host(self.pos_x)
+        self.d_pos_y.copy_to_host(self.pos_y)
+        self.d_pos_z.copy_to_host(self.pos_z)
+        return self._position_block.T
+
+    @property
+    def velocities(self) -> np.ndarray:
+        """(N, 3) host copy of particle velocities"""
+        self.d_vel_x.copy_to_host(self.vel_x)
+        self.d_vel_y.copy_to_host(self.vel_y)
+        self.d_vel_z.copy_to_host(self.vel_z)
+        return self._velocity_block.T
+
+    @property
+    def forces(self) -> np.ndarray:
+        """(N, 3) host copy of the forces from the last step"""
+        self.d_force_x.copy_to_host(self.force_x)
+        self.d_force_y.copy_to_host(self.force_y)
+        self.d_force_z.copy_to_host(self.force_z)
+        return self._force_block.T
+
+    def update(self, dt: float):
+        """Update the SPH simulation"""
+        launch = (self.blocks_per_grid, THREADS_PER_BLOCK)
+
+        # Calculate densities and pressures
+        cuda_calculate_densities_and_pressures[launch](
+            self.d_pos_x,
+            self.d_pos_y,
+            self.d_pos_z,
+            self.d_densities,
+            self.d_pressures,
+            np.float32(self.smoothing_radius),
+            np.float32(self.inv_smoothing_radius),
+            np.float32(self.kernel_constant),
+            np.float32(self.rest_density),
+            np.float32(self.pressure_constant),
+            self.particle_count
+        )
+
+        # Calculate forces
+        cuda_calculate_forces[launch](
+            self.d_pos_x,
+            self.d_pos_y,
+            self.d_pos_z,
+            self.d_vel_x,
+            self.d_vel_y,
+            self.d_vel_z,
+            self.d_densities,
+            self.d_pressures,
+            self.d_force_x,
+            self.d_force_y,
+            self.d_force_z,
+            np.float32(self.smoothing_radius),
+            np.float32(self.inv_smoothing_radius),
+            np.float32(self.gradient_constant),
+            np.float32(self.viscosity),
+            self.gravity[0],
+            self.gravity[1],
+            self.gravity[2],
+            self.particle_count
+        )
+
+        # Integrate motion
+        cuda_integrate_motion[launch](
+            self.d_pos_x,
+            self.d_pos_y,
+            self.d_pos_z,
+            self.d_vel_x,
+            self.d_vel_y,
+            self.d_vel_z,
+            self.d_force_x,
+            self.d_force_y,
+            self.d_force_z,
+            np.float32(dt),
+            self.boundary_min[0], self.boundary_min[1], self.boundary_min[2],
+            self.boundary_max[0], self.boundary_max[1], self.boundary_max[2],
+            np.float32(self.boundary_damping),
+            self.particle_count
+        )
+
+
+def create_sph_system(**kwargs) -> SPHSystem:
+    """Create an SPH system on the GPU when CUDA is available, else on the CPU"""
+    if cuda.is_available():
+        return CudaSPHSystem(**kwargs)
+    return SPHSystem(**kwargs)
+
+
+# Kernels sweep all particles in tiles of THREADS_PER_BLOCK: every block
+# cooperatively stages one tile of particle data into shared memory, then each
+# thread tests its particle against the whole tile. Threads past the particle
+# count stay alive until the end so they still take part in the tile loads
+# and barriers.
+
+@cuda.jit(fastmath=True)
+def cuda_calculate_densities_and_pressures(pos_x, pos_y, pos_z, densities, pressures,
+                                           smoothing_radius, inv_smoothing_radius,
+                                           kernel_constant, rest_density, pressure_constant,
+                                           particle_count):
+    """Calculate density and pressure for each particle using SPH kernel"""
+    tile_x = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_y = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_z = cuda.shared.array(THREADS_PER_BLOCK, f4)
+
+    i = cuda.grid(1)
+    tx = cuda.threadIdx.x
+    h_sq = smoothing_radius * smoothing_radius
+    one = f4(1.0)
+
+    xi = f4(0.0)
+    yi = f4(0.0)
+    zi = f4(0.0)
+    if i < particle_count:
+        xi = pos_x[i]
+        yi = pos_y[i]
+        zi = pos_z[i]
+    density = f4(0.0)
+
+    for tile_start in range(0, particle_count, THREADS_PER_BLOCK):
+        j = tile_start + tx
+        if j < particle_count:
+            tile_x[tx] = pos_x[j]
+            tile_y[tx] = pos_y[j]
+            tile_z[tx] = pos_z[j]
+        cuda.syncthreads()
+
+        for t in range(min(THREADS_PER_BLOCK, particle_count - tile_start)):
+            if tile_start + t == i:
+                continue
+
+            dx = xi - tile_x[t]
+            dy = yi - tile_y[t]
+            dz = zi - tile_z[t]
+            dist_sq = dx*dx + dy*dy + dz*dz
+
+            if dist_sq < h_sq:
+                # Cubic spline kernel
+                q = math.sqrt(dist_sq) * inv_smoothing_radius
+                if q <= f4(0.5):
+                    density += kernel_constant * (one - f4(6.0)*q*q + f4(6.0)*q*q*q)
+                else:
+                    omq = one - q
+                    density += f4(2.0) * kernel_constant * omq*omq*omq
+        cuda.syncthreads()
+
+    if i < particle_count:
+        density = max(density, rest_density * f4(0.1))  # Prevent division by zero
+        densities[i] = density
+        pressures[i] = pressure_constant * (density / rest_density - one)
+
+
+@cuda.jit(fastmath=True)
+def cuda_calculate_forces(pos_x, pos_y, pos_z, vel_x, vel_y, vel_z, densities, pressures,
+                          force_x, force_y, force_z, smoothing_radius, inv_smoothing_radius,
+                          gradient_constant, viscosity, gravity_x, gravity_y, gravity_z,
+                          particle_count):
+    """Calculate forces on each particle (pressure, viscosity, external forces)"""
+    tile_x = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_y = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_z = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_vx = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_vy = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_vz = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_density = cuda.shared.array(THREADS_PER_BLOCK, f4)
+    tile_pressure = cuda.shared.array(THREADS_PER_BLOCK, f4)
+
+    i = cuda.grid(1)
+    tx = cuda.threadIdx.x
+    h_sq = smoothing_radius * smoothing_radius
+    one = f4(1.0)
+
+    xi = f4(0.0)
+    yi = f4(0.0)
+    zi = f4(0.0)
+    vxi = f4(0.0)
+    vyi = f4(0.0)
+    vzi = f4(0.0)
+    pressure_i = f4(0.0)
+    if i < particle_count:
+        xi = pos_x[i]
+        yi = pos_y[i]
+        zi = pos_z[i]
+        vxi = vel_x[i]
+        vyi = vel_y[i]
+        vzi = vel_z[i]
+        pressure_i = pressures[i]
+
+    # Gravity
+    fx = gravity_x
+    fy = gravity_y
+    fz = gravity_z
+
+    for tile_start in range(0, particle_count, THREADS_PER_BLOCK):
+        j = tile_start + tx
+        if j < particle_count:
+            tile_x[tx] = pos_x[j]
+            tile_y[tx] = pos_y[j]
+            tile_z[tx] = pos_z[j]
+            tile_vx[tx] = vel_x[j]
+            tile_vy[tx] = vel_y[j]
+            tile_vz[tx] = vel_z[j]
+            tile_density[tx] = densities[j]
+            tile_pressure[tx] = pressures[j]
+        cuda.syncthreads()
+
+        for t in range(min(THREADS_PER_BLOCK, particle_count - tile_start)):
+            if tile_start + t == i:
+                continue
+
+            dx = xi - tile_x[t]
+            dy = yi - tile_y[t]
+            dz = zi - tile_z[t]
+            dist_sq = dx*dx + dy*dy + dz*dz
+
+            if dist_sq < h_sq:
+                r = math.sqrt(dist_sq)
+                if r > f4(1e-8):  # Prevent division by zero
+                    # Gradient of cubic spline kernel
+                    q = r * inv_smoothing_radius
+                    if q <= f4(0.5):
+                        grad_mag = gradient_constant * q * (f4(3.0) * q - f4(2.0))
+                    else:
+                        omq = one - q
+                        grad_mag = -gradient_constant * omq*omq
+                    grad_scale = grad_mag / r
+
+                    # Pressure + viscosity force
+                    pressure_term = (pressure_i + tile_pressure[t]) * f4(0.5)
+                    inv_density_j = one / tile_density[t]
+                    fx += dx * grad_scale * (viscosity * (tile_vx[t] - vxi) - pressure_term) * inv_density_j
+                    fy += dy * grad_scale * (viscosity * (tile_vy[t] - vyi) - pressure_term) * inv_density_j
+                    fz += dz * grad_scale * (viscosity * (tile_vz[t] - vzi) - pressure_term) * inv_density_j
+        cuda.syncthreads()
+
+    if i < particle_count:
+        force_x[i] = fx
+        force_y[i] = fy
+        force_z[i] = fz
+
+
+@cuda.jit(fastmath=True)
+def cuda_integrate_motion(pos_x, pos_y, pos_z, vel_x, vel_y, vel_z, force_x, force_y, force_z,
+                          dt, min_x, min_y, min_z, max_x, max_y, max_z, boundary_damping,
+                          particle_count):
+    """Integrate particle motion using Verlet integration"""
+    i = cuda.grid(1)
+    if i >= particle_count:
+        return
+
+    # Update velocity (forces already include gravity)
+    vx = vel_x[i] + force_x[i] * dt
+    vy = vel_y[i] + force_y[i] * dt
+    vz = vel_z[i] + force_z[i] * dt
+
+    # Update position
+    x = pos_x[i] + vx * dt
+    y = pos_y[i] + vy * dt
+    z = pos_z[i] + vz * dt
+
+    # Boundary collision handling
+    if x < min_x:
+        x = min_x
+        vx *= boundary_damping
+    elif x > max_x:
+        x = max_x
+        vx *= boundary_damping
+
+    if y < min_y:
+        y = min_y
+        vy *= boundary_damping
+    elif y > max_y:
+        y = max_y
+        vy *= boundary_damping
+
+    if z < min_z:
+        z = min_z
+        vz *= boundary_damping
+    elif z > max_z:
+        z = max_z
+        vz *= boundary_damping
+
+    pos_x[i] = x
+    pos_y[i] = y
+    pos_z[i] = z
+    vel_x[i] = vx
+    vel_y[i] = vy
+    vel_z[i] = vz
@@ -1,32 +1,298 @@
 """
 Deferred rendering system
 Implements deferred shading pipeline with G-buffer and lighting pass
+
+Buffer usage hints (keep these when adding buffers; drivers place buffers in
+different memory pools based on them):
+- Static (GL_STATIC_DRAW, ``dynamic=False``): written once at creation, e.g.
+  mesh vertex buffers.
+- Stream (GL_STREAM_DRAW): rewritten every frame and read once, e.g. the
+  instance ring. moderngl only offers GL_DYNAMIC_DRAW, so stream buffers
+  are re-specified with _stream_buffer().
 """
+import ctypes
+import math
 import moderngl
 import numpy as np
-from typing import Optional
+import OpenGL.GL as gl
+from numba import njit
+from typing import Dict, Optional
 from ..core.scene import Scene
 from ..core.component import Transform, Renderable
 
 
+# Per-instance data: mat4 model + mat3 normal matrix
+INSTANCE_FLOATS = 16 + 9
+INSTANCE_BYTES = INSTANCE_FLOATS * 4
+# Instances per frame the instance ring starts with; grown on demand
+INITIAL_INSTANCE_CAPACITY = 4096
+# Frames of instance data in flight. Each frame writes its own slot of the
+# ring, so uploads never overwrite data the GPU may still be reading
+RING_FRAMES = 3
+# G-buffer dimensions are rounded up to a multiple of this, so small resizes
+# (e.g. dragging the window edge) don't reallocate it every frame
+GBUFFER_SIZE_STEP = 64
+# Diameter in pixels of the point sprites fluid particles are drawn as
+PARTICLE_POINT_SIZE = 6.0
+
+
+# Shader sources. Fragment shaders are composed from shared snippets, so
+# every pass decodes the G-buffer the same way.
+_GLSL_VERSION = '#version 330 core'
+
+# Fullscreen triangle generated from the vertex ID; shared by all
+# fullscreen passes (see _create_screen_quad)
+_QUAD_VS = f'''{_GLSL_VERSION}
+out vec2 texcoord;
+
+void main() {{
+    vec2 p = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    texcoord = p;
+    gl_Position = vec4(p * 2.0 - 1.0, 0.0, 1.0);
+}}
+'''
+
+# Octahedral normal encoding; the target is a float format, so encoded
+# normals are stored in [-1, 1] without a bias
+_OCTAHEDRAL_GLSL = '''
+vec2 sign_not_zero(vec2 v) {
+    return vec2(v.x >= 0.0 ? 1.0 : -1.0, v.y >= 0.0 ? 1.0 : -1.0);
+}
+
+vec2 encode_normal(vec3 n) {
+    n /= abs(n.x) + abs(n.y) + abs(n.z);
+    return n.z >= 0.0 ? n.xy : (1.0 - abs(n.yx)) * sign_not_zero(n.xy);
+}
+
+vec3 decode_normal(vec2 e) {
+    vec3 n = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    if (n.z < 0.0) {
+        n.xy = (1.0 - abs(n.yx)) * sign_not_zero(n.xy);
+    }
+    return normalize(n);
+}
+'''
+
+# G-buffer reads for fullscreen passes. The G-buffer may be larger than the
+# viewport, so it is read by pixel rather than by normalized coordinate
+_GBUFFER_GLSL = f'''
+uniform sampler2D g_depth;
+uniform sampler2D g_normal;
+uniform sampler2D g_albedo;
+uniform mat4 inv_view_proj;
+
+{_OCTAHEDRAL_GLSL}
+
+struct GBufferSample {{
+    vec3 position;  // World space, reconstructed from depth
+    vec3 normal;
+    vec4 albedo_spec;
+}};
+
+GBufferSample sample_gbuffer(vec2 texcoord) {{
+    ivec2 pixel = ivec2(gl_FragCoord.xy);
+    
+    vec2 ndc = texcoord * 2.0 - 1.0;
+    float z = texelFetch(g_depth, pixel, 0).r * 2.0 - 1.0;
+    vec4 world = inv_view_proj * vec4(ndc, z, 1.0);
+    
+    GBufferSample g;
+    g.position = world.xyz / world.w;
+    g.normal = decode_normal(texelFetch(g_normal, pixel, 0).rg);
+    g.albedo_spec = texelFetch(g_albedo, pixel, 0);
+    return g;
+}}
+'''
+
+_GEOMETRY_VS = f'''{_GLSL_VERSION}
+in vec3 in_position;
+in vec3 in_normal;
+in vec3 in_color;
+in mat4 in_model;          // per instance
+in mat3 in_normal_matrix;  // per instance
+
+uniform mat4 view;
+uniform mat4 projection;
+
+out vec3 frag_normal;
+out vec3 frag_color;
+
+void main() {{
+    vec4 world_pos = in_model * vec4(in_position, 1.0);
+    gl_Position = projection * view * world_pos;
+    
+    frag_normal = in_normal_matrix * in_normal;
+    frag_color = in_color;
+}}
+'''
+
+_GEOMETRY_FS = f'''{_GLSL_VERSION}
+in vec3 frag_normal;
+in vec3 frag_color;
+
+// vec4 so the blend stage sees alpha 1; only RG are stored
+out vec4 out_normal;
+out vec4 out_albedo;
+
+{_OCTAHEDRAL_GLSL}
+
+void main() {{
+    out_normal = vec4(encode_normal(normalize(frag_normal)), 0.0, 1.0);
+    out_albedo = vec4(frag_color, 1.0);
+}}
+'''
+
+_LIGHTING_FS = f'''{_GLSL_VERSION}
+in vec2 texcoord;
+out vec4 out_color;
+
+uniform vec3 light_pos = vec3(2.0, 4.0, 2.0);
+uniform vec3 light_color = vec3(1.0, 1.0, 1.0);
+uniform vec3 camera_pos;
+
+{_GBUFFER_GLSL}
+
+void main() {{
+    GBufferSample g = sample_gbuffer(texcoord);
+    vec3 albedo = g.albedo_spec.rgb;
+    
+    // Simple point light calculation
+    vec3 light_dir = normalize(light_pos - g.position);
+    vec3 view_dir = normalize(camera_pos - g.position);
+    vec3 reflect_dir = reflect(-light_dir, g.normal);
+    
+    float diff = max(dot(light_dir, g.normal), 0.0);
+    float spec = pow(max(dot(view_dir, reflect_dir), 0.0), 32.0);
+    
+    vec3 ambient = 0.1 * albedo;
+    vec3 diffuse = diff * light_color * albedo;
+    vec3 specular = spec * light_color * g.albedo_spec.a;
+    
+    out_color = vec4(ambient + diffuse + specular, 1.0);
+}}
+'''
+
+# Fluid particles: points shaded as camera-facing spheres
+_PARTICLE_VS = f'''{_GLSL_VERSION}
+in vec3 in_position;
+
+uniform mat4 view;
+uniform mat4 projection;
+
+void main() {{
+    gl_Position = projection * view * vec4(in_position, 1.0);
+}}
+'''
+
+_PARTICLE_FS = f'''{_GLSL_VERSION}
+out vec4 out_normal;  // See _GEOMETRY_FS
+out vec4 out_albedo;
+
+uniform mat4 view;
+uniform vec3 particle_color = vec3(0.2, 0.45, 0.9);
+
+{_OCTAHEDRAL_GLSL}
+
+void main() {{
+    vec2 p = gl_PointCoord * 2.0 - 1.0;
+    float r2 = dot(p, p);
+    if (r2 > 1.0) {{
+        discard;
+    }}
+    
+    // View-space sphere normal, rotated back to world space
+    vec3 n = vec3(p.x, -p.y, sqrt(1.0 - r2));
+    out_normal = vec4(encode_normal(n * mat3(view)), 0.0, 1.0);
+    out_albedo = vec4(particle_color, 1.0);
+}}
+'''
+
+_SCREEN_FS = f'''{_GLSL_VERSION}
+in vec2 texcoord;
+out vec4 out_color;
+
+uniform sampler2D screen_texture;
+
+void main() {{
+    out_color = texture(screen_texture, texcoord);
+}}
+'''
+
+
 class DeferredRenderer:
     """Deferred rendering pipeline implementation"""
     
     def __init__(self, opengl_widget):
         self.opengl_widget = opengl_widget
         self.ctx = None
+        self.screen_fbo = None
         self.geometry_fbo = None
         self.lighting_fbo = None
         self.screen_quad_vao = None
         self.geometry_program = None
         self.lighting_program = None
         self.screen_program = None
+        self._programs = {}  # (vertex source, fragment source) -> Program
         
-        # G-buffer textures
-        self.position_texture = None
+        # G-buffer textures (world positions are reconstructed from depth)
         self.normal_texture = None
         self.albedo_texture = None
         self.depth_texture = None
+        self._gbuffer_names = None  # GL names of depth/normal/albedo, bound to units 0-2
+        self._gbuffer_size = None  # Allocated size (rounded up)
+        self._viewport_size = None  # Size actually rendered
+        
+        # Camera matrices, shared by both passes. They are allocated once and
+        # updated in place, only when the inputs change (see
+        # _update_camera_matrices()); uniforms read them through the buffer
+        # protocol, so uploads never allocate
+        self.view_matrix = np.eye(4, dtype=np.float32)
+        self.projection_matrix = np.zeros((4, 4), dtype=np.float32)
+        self.inv_view_proj_matrix = np.eye(4, dtype=np.float32)
+        self.camera_position = np.array([0.0, 0.0, 5.0], dtype=np.float32)
+        self._proj_cache_key = None
+        
+        # Per-instance data for instanced draws: a staging array for the
+        # current frame, and a ring of RING_FRAMES slots on the GPU, each
+        # guarded by a fence set after the frame that used it. Every mesh
+        # has one VAO; its instance attributes are rebound per draw
+        self._instance_capacity = 0
+        self._instance_data = None
+        self._instance_models = None
+        self._instance_normals = None
+        self._instance_ring = None
+        self._ring_frame = 0
+        self._ring_fences = [None] * RING_FRAMES
+        self._mesh_vaos: Dict[int, moderngl.VertexArray] = {}
+        
+        # Draw list scratch: entity rows bucketed by mesh, and the instance
+        # count and first instance of each mesh (see build_draw_list)
+        self._draw_rows = np.empty(0, dtype=np.int64)
+        self._draw_counts = np.empty(0, dtype=np.int64)
+        self._draw_offsets = np.empty(0, dtype=np.int64)
+        
+        # Fluid particles, drawn as points in the geometry pass. Positions
+        # are uploaded by set_particles()
+        self.particle_program = None
+        self._particle_buffer = None
+        self._particle_vao = None
+        self._particle_capacity = 0
+        self._particle_count = 0
+        self._particle_version = 0  # Bumped by every upload
+        
+        # Framebuffer bound by the last _bind_fbo() call (None = default)
+        self._current_fbo = None
+        self._fbo_bound = False
+        # Whether glInvalidateFramebuffer is usable (GL 4.3 / ARB_invalidate_subdata);
+        # only known once a context is current, so resolved on first use
+        self._can_invalidate = None
+        # Same for glBindTextures (GL 4.4 / ARB_multi_bind)
+        self._can_multi_bind = None
+        
+        # Inputs of the last geometry pass; while they are unchanged (and
+        # the G-buffer still holds its result) the pass is skipped
+        self._last_signature = None
+        self._gbuffer_valid = False
         
         # Initialize renderer
         self._init_renderer()
@@ -34,283 +300,463 @@ class DeferredRenderer:
     def _init_renderer(self):
         """Initialize the deferred rendering pipeline"""
         self.ctx = self.opengl_widget.ctx
+        # Framebuffer.use() repoints ctx.fbo, so remember the default one now
+        self.screen_fbo = self.ctx.fbo
         
         # Create G-buffer textures
-        self._create_gbuffer()
+        self.resize(*self.screen_fbo.size)
         
         # Create shader programs
         self._create_shaders()
         
-        # Create fullscreen quad for lighting pass
+        # G-buffer textures always sit on units 0-2 (see _bind_gbuffer_textures)
+        self.lighting_program['g_depth'].value = 0
+        self.lighting_program['g_normal'].value = 1
+        self.lighting_program['g_albedo'].value = 2
+        
+        # Create fullscreen triangle for lighting pass
         self._create_screen_quad()
+        
+        self._grow_instance_ring(INITIAL_INSTANCE_CAPACITY)
     
-    def _create_gbuffer(self):
-        """Create G-buffer textures for deferred rendering"""
-        # Get viewport dimensions
-        width, height = self.ctx.fbo.size
+    def screen_resized(self):
+        """Follow the screen framebuffer after a window resize (call from resizeGL)
         
-        # Create textures for G-buffer with formats compatible with multiple render targets
-        self.position_texture = self.ctx.texture(
-            (width, height), 
-            components=4,  # Use 4 components to ensure compatibility
-            dtype='f4',
-            internal_format=moderngl.RGBA32F  # Explicitly specify format for MRT compatibility
-        )
-        self.position_texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        QOpenGLWidget recreates its framebuffer on resize, and moderngl only
+        reads a framebuffer's size when detecting it, so the bound one is
+        detected again.
+        """
+        self.screen_fbo = self.ctx.detect_framebuffer()
+        self._invalidate_fbo_cache()
+        self.resize(*self.screen_fbo.size)
+    
+    def resize(self, width: int, height: int):
+        """Match the G-buffer to the viewport, reallocating only when it outgrows it"""
+        if (width, height) == self._viewport_size:
+            return
+        self._viewport_size = (width, height)
+        
+        step = GBUFFER_SIZE_STEP
+        size = (-(-width // step) * step, -(-height // step) * step)
+        if size != self._gbuffer_size:
+            self._release_gbuffer()
+            self._create_gbuffer(*size)
+        # Only the true viewport area of the G-buffer is drawn and read
+        self.geometry_fbo.viewport = (0, 0, width, height)
+        self._invalidate_fbo_cache()
+    
+    def _create_gbuffer(self, width: int, height: int):
+        """Create G-buffer textures for deferred rendering"""
+        self._gbuffer_size = (width, height)
+        self._gbuffer_valid = False
+        self._invalidate_fbo_cache()
         
+        # Create textures for G-buffer, kept as small as the data allows since
+        # the lighting pass is bandwidth bound
         self.normal_texture = self.ctx.texture(
             (width, height), 
-            components=4,  # Use 4 components to ensure compatibility
-            dtype='f4',
-            internal_format=moderngl.RGBA32F  # Explicitly specify format for MRT compatibility
+            components=2,  # Octahedral-encoded unit normal (RG16F)
+            dtype='f2'
         )
-        self.normal_texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        # Interpolating octahedral normals across the fold gives garbage
+        self.normal_texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
         
         self.albedo_texture = self.ctx.texture(
             (width, height), 
-            components=4, 
-            dtype='f4',
-            internal_format=moderngl.RGBA32F  # Explicitly specify format for MRT compatibility
+            components=4,  # RGBA8: color + specular intensity
+            dtype='f1'
         )
         self.albedo_texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
         
+        # Depth doubles as the position source for the lighting pass, so it is
+        # sampled as a plain texture (no depth compare, no filtering)
         self.depth_texture = self.ctx.depth_texture((width, height))
+        self.depth_texture.compare_func = ''
+        self.depth_texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
         
         # Create geometry framebuffer
         self.geometry_fbo = self.ctx.framebuffer(
             color_attachments=[
-                self.position_texture,
                 self.normal_texture, 
                 self.albedo_texture
             ],
             depth_attachment=self.depth_texture
         )
+        
+        self._gbuffer_names = (ctypes.c_uint * 3)(
+            self.depth_texture.glo, self.normal_texture.glo, self.albedo_texture.glo
+        )
+    
+    def _release_gbuffer(self):
+        """Release the G-buffer textures and framebuffer"""
+        for resource in (self.geometry_fbo, self.normal_texture, self.albedo_texture,
+                         self.depth_texture):
+            if resource:
+                resource.release()
+        self.geometry_fbo = None
+        self.normal_texture = None
+        self.albedo_texture = None
+        self.depth_texture = None
+        self._gbuffer_names = None
+        self._gbuffer_size = None
     
     def _create_shaders(self):
         """Create shader programs for deferred rendering"""
-        # Geometry pass shader
-        self.geometry_program = self.ctx.program(
-            vertex_shader='''
-                #version 330 core
-                in vec3 in_position;
-                in vec3 in_normal;
-                in vec3 in_color;
-                
-                uniform mat4 model;
-                uniform mat4 view;
-                uniform mat4 projection;
-                
-                out vec3 frag_position;
-                out vec3 frag_normal;
-                out vec3 frag_color;
-                
-                void main() {
-                    vec4 world_pos = model * vec4(in_position, 1.0);
-                    gl_Position = projection * view * world_pos;
-                    
-                    frag_position = world_pos.xyz;
-                    frag_normal = mat3(transpose(inverse(model))) * in_normal;
-                    frag_color = in_color;
-                }
-            ''',
-            fragment_shader='''
-                #version 330 core
-                in vec3 frag_position;
-                in vec3 frag_normal;
-                in vec3 frag_color;
-                
-                out vec4 out_position;
-                out vec4 out_normal;
-                out vec4 out_albedo;
-                
-                void main() {
-                    out_position = vec4(frag_position, 1.0);
-                    out_normal = vec4(normalize(frag_normal), 1.0);
-                    out_albedo = vec4(frag_color, 1.0);
-                }
-            '''
-        )
-        
-        # Lighting pass shader
-        self.lighting_program = self.ctx.program(
-            vertex_shader='''
-                #version 330 core
-                in vec2 in_texcoord;
-                out vec2 texcoord;
-                
-                void main() {
-                    gl_Position = vec4(in_texcoord * 2.0 - 1.0, 0.0, 1.0);
-                    texcoord = in_texcoord;
-                }
-            ''',
-            fragment_shader='''
-                #version 330 core
-                in vec2 texcoord;
-                out vec4 out_color;
-                
-                uniform sampler2D g_position;
-                uniform sampler2D g_normal;
-                uniform sampler2D g_albedo;
-                uniform vec3 light_pos = vec3(2.0, 4.0, 2.0);
-                uniform vec3 light_color = vec3(1.0, 1.0, 1.0);
-                uniform vec3 camera_pos;
-                
-                void main() {
-                    vec3 frag_pos = texture(g_position, texcoord).rgb;  // Extract RGB only
-                    vec3 normal = texture(g_normal, texcoord).rgb;      // Extract RGB only
-                    vec4 albedo_spec = texture(g_albedo, texcoord);
-                    vec3 albedo = albedo_spec.rgb;
-                    
-                    // Simple point light calculation
-                    vec3 light_dir = normalize(light_pos - frag_pos);
-                    vec3 view_dir = normalize(camera_pos - frag_pos);
-                    vec3 reflect_dir = reflect(-light_dir, normal);
-                    
-                    float diff = max(dot(light_dir, normal), 0.0);
-                    float spec = pow(max(dot(view_dir, reflect_dir), 0.0), 32.0);
-                    
-                    vec3 ambient = 0.1 * albedo;
-                    vec3 diffuse = diff * light_color * albedo;
-                    vec3 specular = spec * light_color * albedo_spec.a;
-                    
-                    out_color = vec4(ambient + diffuse + specular, 1.0);
-                }
-            '''
-        )
-        
+        self.geometry_program = self._program(_GEOMETRY_VS, _GEOMETRY_FS)
+        self.lighting_program = self._program(_QUAD_VS, _LIGHTING_FS)
         # Simple screen quad shader for debugging
-        self.screen_program = self.ctx.program(
-            vertex_shader='''
-                #version 330 core
-                in vec2 in_texcoord;
-                out vec2 texcoord;
-                
-                void main() {
-                    gl_Position = vec4(in_texcoord * 2.0 - 1.0, 0.0, 1.0);
-                    texcoord = in_texcoord;
-                }
-            ''',
-            fragment_shader='''
-                #version 330 core
-                in vec2 texcoord;
-                out vec4 out_color;
-                
-                uniform sampler2D screen_texture;
-                
-                void main() {
-                    out_color = texture(screen_texture, texcoord);
-                }
-            '''
-        )
+        self.screen_program = self._program(_QUAD_VS, _SCREEN_FS)
+        self.particle_program = self._program(_PARTICLE_VS, _PARTICLE_FS)
+    
+    def _program(self, vertex_shader: str, fragment_shader: str) -> moderngl.Program:
+        """Compile a program, reusing an earlier one built from the same sources"""
+        key = (vertex_shader, fragment_shader)
+        program = self._programs.get(key)
+        if program is None:
+            program = self.ctx.program(vertex_shader=vertex_shader,
+                                       fragment_shader=fragment_shader)
+            self._programs[key] = program
+        return program
     
     def _create_screen_quad(self):
-        """Create a fullscreen quad for post-processing"""
-        quad_vertices = np.array([
-            -1.0,  1.0,  0.0, 1.0,  # top-left
-             1.0,  1.0,  1.0, 1.0,  # top-right
-            -1.0, -1.0,  0.0, 0.0,  # bottom-left
-             1.0, -1.0,  1.0, 0.0   # bottom-right
-        ], dtype=np.float32)
-        
-        vbo = self.ctx.buffer(quad_vertices)
-        self.screen_quad_vao = self.ctx.vertex_array(
-            self.screen_program,
-            [(vbo, '2f 2f', 'in_position', 'in_texcoord')],
-        )
+        """Create the vertex array for fullscreen passes
+        
+        Draws one oversized triangle whose corners come from gl_VertexID, so
+        no vertex buffer is needed and there is no diagonal seam where the
+        rasterizer would shade pixels twice.
+        """
+        self.screen_quad_vao = self.ctx.vertex_array(self.lighting_program, [])
     
     def render(self, scene: Scene):
         """Render the scene using deferred rendering"""
-        # Clear buffers
-        self.ctx.clear(0.0, 0.0, 0.0, 1.0)
+        # Qt and other code bind framebuffers between frames
+        self._invalidate_fbo_cache()
         
-        # Geometry pass: render scene to G-buffer
-        self._geometry_pass(scene)
+        self._update_camera_matrices()
         
-        # Lighting pass: apply lighting using G-buffer
+        # Every framebuffer is cleared right after it is bound, so tiled GPUs
+        # never have to load its previous contents
+        
+        # Geometry pass: render scene to G-buffer, unless nothing it depends
+        # on changed since the G-buffer was last filled
+        signature = self._scene_signature(scene)
+        changed = signature != self._last_signature
+        if changed or not self._gbuffer_valid:
+            self._geometry_pass(scene)
+            self._gbuffer_valid = True
+        self._last_signature = signature
+        
+        # Lighting pass: apply lighting using G-buffer. Always run, since the
+        # screen framebuffer isn't guaranteed to survive the buffer swap
         self._lighting_pass(scene)
-    
-    def _geometry_pass(self, scene: Scene):
-        """Render geometry to G-buffer"""
-        self.geometry_fbo.use()
-        self.geometry_fbo.clear(0.0, 0.0, 0.0, 0.0)
         
-        # Set up matrices (simplified)
-        view = np.eye(4, dtype=np.float32)
-        projection = np.eye(4, dtype=np.float32)
+        # While the scene keeps changing, the next geometry pass will clear
+        # the depth anyway; once it settles, keep it so that pass can be skipped
+        if changed:
+            self._invalidate_gbuffer_depth()
+    
+    def _scene_signature(self, scene: Scene):
+        """Cheap summary of everything the geometry pass output depends on"""
+        camera = scene.camera
+        return (
+            id(scene),
+            scene.version,
+            scene.transforms.version,
+            camera.transform.version if camera is not None else None,
+            self._proj_cache_key,
+            self._particle_version,
+        )
+    
+    def _bind_fbo(self, fbo: Optional[moderngl.Framebuffer]):
+        """Bind a framebuffer (None for the default one) unless it is already bound"""
+        if self._fbo_bound and fbo is self._current_fbo:
+            return
+        (fbo or self.screen_fbo).use()
+        self._current_fbo = fbo
+        self._fbo_bound = True
+    
+    def _invalidate_fbo_cache(self):
+        """Forget the cached binding, e.g. after framebuffers were recreated"""
+        self._current_fbo = None
+        self._fbo_bound = False
+    
+    def _invalidate_gbuffer_depth(self):
+        """Tell the driver the G-buffer depth need not be stored back to memory"""
+        if self._can_invalidate is None:
+            self._can_invalidate = bool(gl.glInvalidateFramebuffer)
+        if not self._can_invalidate:
+            return
         
-        # Set up perspective projection
-        fovy = np.radians(60.0)
-        aspect = self.ctx.fbo.size[0] / self.ctx.fbo.size[1]
+        # Invalidate through the read binding so moderngl's draw binding is untouched
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, self.geometry_fbo.glo)
+        gl.glInvalidateFramebuffer(gl.GL_READ_FRAMEBUFFER, 1, [gl.GL_DEPTH_ATTACHMENT])
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, self.screen_fbo.glo)
+        self._gbuffer_valid = False
+    
+    def _update_camera_matrices(self):
+        """Rebuild the projection (and inverse view-projection) if its inputs changed"""
+        # Set up perspective projection (view is fixed at identity for now)
+        width, height = self.screen_fbo.size
+        fovy = 60.0
         near = 0.1
         far = 100.0
         
-        projection[0, 0] = 1.0 / (aspect * np.tan(fovy / 2.0))
-        projection[1, 1] = 1.0 / np.tan(fovy / 2.0)
+        key = (width, height, fovy, near, far)
+        if key == self._proj_cache_key:
+            return
+        self._proj_cache_key = key
+        
+        aspect = width / height
+        f = 1.0 / math.tan(math.radians(fovy) / 2.0)
+        projection = self.projection_matrix
+        projection.fill(0.0)
+        projection[0, 0] = f / aspect
+        projection[1, 1] = f
         projection[2, 2] = -(far + near) / (far - near)
         projection[2, 3] = -2.0 * far * near / (far - near)
         projection[3, 2] = -1.0
         
-        self.geometry_program['view'].write(view.tobytes())
-        self.geometry_program['projection'].write(projection.tobytes())
-        
-        # Render each renderable entity
-        for entity in scene.entities:
-            if not entity.active:
-                continue
-                
-            renderable = entity.get_component('Renderable')
-            if renderable and renderable.visible:
-                # Get model matrix from transform
-                model_matrix = entity.transform.get_matrix()
-                self.geometry_program['model'].write(model_matrix.tobytes())
-                
-                # Render the mesh (simplified - would need actual mesh data)
-                self._render_mesh(renderable.mesh)
+        # Uploaded with the same layout as view/projection in the geometry pass
+        self.inv_view_proj_matrix[:] = np.linalg.inv(projection @ self.view_matrix)
+    
+    def _geometry_pass(self, scene: Scene):
+        """Render geometry to G-buffer"""
+        self._bind_fbo(self.geometry_fbo)
+        self.geometry_fbo.clear(0.0, 0.0, 0.0, 0.0)
+        
+        self._render_particles()
+        
+        self.geometry_program['view'].write(self.view_matrix)
+        self.geometry_program['projection'].write(self.projection_matrix)
+        
+        # Bucket the drawable entity rows by mesh so each mesh is one
+        # instanced draw, all in compiled code
+        n = len(scene.entities)
+        mesh_count = len(scene.meshes)
+        if len(self._draw_rows) < n:
+            self._draw_rows = np.empty(max(n, 2 * len(self._draw_rows)), dtype=np.int64)
+        if len(self._draw_counts) < mesh_count:
+            self._draw_counts = np.empty(max(mesh_count, 2 * len(self._draw_counts)), dtype=np.int64)
+            self._draw_offsets = np.empty_like(self._draw_counts)
+        counts = self._draw_counts[:mesh_count]
+        offsets = self._draw_offsets[:mesh_count]
+        total = build_draw_list(scene.active_mask[:n], scene.visible_mask[:n], scene.mesh_ids[:n],
+                                counts, offsets, self._draw_rows)
+        if total == 0:
+            return
+        if total > self._instance_capacity:
+            self._grow_instance_ring(max(total, 2 * self._instance_capacity))
+        
+        # Pack every group's instances into the staging array back to back
+        models = self._instance_models
+        scene.collect_transforms(self._draw_rows[:total], models[:total])
+        
+        # Model matrices are translation @ rotation @ scale, so the inverse
+        # transpose of their 3x3 part is rotation @ scale^-1: the same
+        # columns divided by their squared lengths
+        linear = models[:total, :3, :3]
+        np.divide(linear, np.einsum('nij,nij->nj', linear, linear)[:, None, :],
+                  out=self._instance_normals[:total])
+        
+        # Upload the frame into its ring slot, once the GPU is done with it
+        slot = self._ring_frame
+        self._wait_ring_fence(slot)
+        slot_offset = slot * self._instance_capacity * INSTANCE_BYTES
+        self._instance_ring.write(memoryview(self._instance_data[:total]), offset=slot_offset)
+        
+        for mesh_id in np.flatnonzero(counts):
+            self._render_mesh(scene.meshes[mesh_id], slot_offset + int(offsets[mesh_id]) * INSTANCE_BYTES,
+                              int(counts[mesh_id]))
+        
+        self._ring_fences[slot] = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self._ring_frame = (slot + 1) % RING_FRAMES
+    
+    def set_particles(self, positions: np.ndarray):
+        """Upload (N, 3) float32 particle positions to draw from the next frame on
+        
+        The buffer is orphaned before every upload, so the copy never waits
+        for a frame that is still reading the previous positions.
+        """
+        count = len(positions)
+        if count > self._particle_capacity:
+            self._release_particles()
+            self._particle_buffer = self._stream_buffer(count * 12)
+            self._particle_vao = self.ctx.vertex_array(
+                self.particle_program, [(self._particle_buffer, '3f', 'in_position')]
+            )
+            self._particle_capacity = count
+        if count:
+            self._orphan_stream_buffer(self._particle_buffer)
+            self._particle_buffer.write(memoryview(np.ascontiguousarray(positions, dtype=np.float32)))
+        self._particle_count = count
+        self._particle_version += 1
+    
+    def _render_particles(self):
+        """Draw the fluid particles into the bound G-buffer"""
+        if self._particle_count == 0:
+            return
+        self.particle_program['view'].write(self.view_matrix)
+        self.particle_program['projection'].write(self.projection_matrix)
+        self.ctx.point_size = PARTICLE_POINT_SIZE
+        self._particle_vao.render(moderngl.POINTS, vertices=self._particle_count)
+    
+    def _release_particles(self):
+        """Release the particle buffer and its vertex array"""
+        if self._particle_vao:
+            self._particle_vao.release()
+        if self._particle_buffer:
+            self._particle_buffer.release()
+        self._particle_vao = None
+        self._particle_buffer = None
+        self._particle_capacity = 0
+        self._particle_count = 0
+    
+    def _stream_buffer(self, size: int) -> moderngl.Buffer:
+        """Create a buffer of ``size`` bytes with the GL_STREAM_DRAW usage hint"""
+        buffer = self.ctx.buffer(reserve=size, dynamic=True)
+        self._orphan_stream_buffer(buffer)
+        return buffer
+    
+    def _orphan_stream_buffer(self, buffer: moderngl.Buffer):
+        """Give a buffer fresh GL_STREAM_DRAW storage of the same size"""
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer.glo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, buffer.size, None, gl.GL_STREAM_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+    
+    def _wait_ring_fence(self, slot: int):
+        """Block until the GPU has finished reading a ring slot"""
+        fence = self._ring_fences[slot]
+        if fence is None:
+            return
+        while gl.glClientWaitSync(fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, 1000000) == gl.GL_TIMEOUT_EXPIRED:
+            pass
+        gl.glDeleteSync(fence)
+        self._ring_fences[slot] = None
+    
+    def _grow_instance_ring(self, capacity: int):
+        """Reallocate per-instance storage for ``capacity`` instances per frame"""
+        for slot in range(RING_FRAMES):
+            self._wait_ring_fence(slot)
+        if self._instance_ring:
+            self._instance_ring.release()
+        
+        self._instance_capacity = capacity
+        self._instance_data = np.empty((capacity, INSTANCE_FLOATS), dtype=np.float32)
+        self._instance_models = self._instance_data[:, :16].reshape(-1, 4, 4)
+        self._instance_normals = self._instance_data[:, 16:].reshape(-1, 3, 3)
+        self._instance_ring = self._stream_buffer(RING_FRAMES * capacity * INSTANCE_BYTES)
+        self._ring_frame = 0
     
     def _lighting_pass(self, scene: Scene):
         """Apply lighting using G-buffer"""
         # Bind screen framebuffer
-        self.ctx.bind_framebuffer(0)  # Default framebuffer
+        self._bind_fbo(None)  # Default framebuffer
+        self.screen_fbo.clear(0.0, 0.0, 0.0, 1.0, depth=1.0)
         
-        # Use lighting shader
-        self.lighting_program.use()
+        self._bind_gbuffer_textures()
         
-        # Bind G-buffer textures
-        self.position_texture.use(location=0)
-        self.normal_texture.use(location=1) 
-        self.albedo_texture.use(location=2)
+        self.lighting_program['inv_view_proj'].write(self.inv_view_proj_matrix)
+        self.lighting_program['camera_pos'].write(self.camera_position)
         
-        self.lighting_program['g_position'].value = 0
-        self.lighting_program['g_normal'].value = 1
-        self.lighting_program['g_albedo'].value = 2
-        self.lighting_program['camera_pos'].value = (0.0, 0.0, 5.0)  # Camera position
+        # Render fullscreen triangle
+        self.screen_quad_vao.render(moderngl.TRIANGLES, vertices=3)
+    
+    def _bind_gbuffer_textures(self):
+        """Bind depth, normal and albedo to texture units 0, 1 and 2"""
+        if self._can_multi_bind is None:
+            self._can_multi_bind = bool(gl.glBindTextures)
         
-        # Render fullscreen quad
-        self.screen_quad_vao.render(moderngl.TRIANGLE_STRIP)
+        if self._can_multi_bind:
+            gl.glBindTextures(0, 3, self._gbuffer_names)
+        else:
+            self.depth_texture.use(location=0)
+            self.normal_texture.use(location=1)
+            self.albedo_texture.use(location=2)
     
-    def _render_mesh(self, mesh):
-        """Render a mesh (placeholder - would implement actual mesh rendering)"""
-        # This is a placeholder for actual mesh rendering
-        # In a real implementation, this would render actual geometry
-        pass
+    def _render_mesh(self, mesh, offset: int, instance_count: int):
+        """Draw ``instance_count`` instances of a mesh
+        
+        Per-instance model and normal matrices are read from the instance
+        ring starting at byte ``offset``. Meshes are expected to provide
+        ``vbo``, a buffer of interleaved position/normal/color vertices;
+        placeholder meshes (None) are skipped.
+        """
+        if mesh is None:
+            return
+        
+        vao = self._mesh_vaos.get(id(mesh))
+        if vao is None:
+            vao = self.ctx.vertex_array(
+                self.geometry_program,
+                [(mesh.vbo, '3f 3f 3f', 'in_position', 'in_normal', 'in_color')],
+            )
+            self._mesh_vaos[id(mesh)] = vao
+        
+        # Point the per-instance attributes at this draw's slice of the ring,
+        # one matrix column per attribute location
+        model_location = self.geometry_program['in_model'].location
+        normal_location = self.geometry_program['in_normal_matrix'].location
+        for column in range(4):
+            vao.bind(model_location + column, 'f', self._instance_ring, '4f',
+                     offset=offset + 16 * column, stride=INSTANCE_BYTES, divisor=1)
+        for column in range(3):
+            vao.bind(normal_location + column, 'f', self._instance_ring, '3f',
+                     offset=offset + 64 + 12 * column, stride=INSTANCE_BYTES, divisor=1)
+        
+        vao.render(instances=instance_count)
     
     def cleanup(self):
         """Clean up renderer resources"""
-        if self.geometry_fbo:
-            self.geometry_fbo.release()
-        if self.position_texture:
-            self.position_texture.release()
-        if self.normal_texture:
-            self.normal_texture.release()
-        if self.albedo_texture:
-            self.albedo_texture.release()
-        if self.depth_texture:
-            self.depth_texture.release()
+        self._invalidate_fbo_cache()
+        self._release_gbuffer()
+        self._viewport_size = None
         if self.screen_quad_vao:
             self.screen_quad_vao.release()
-        if self.geometry_program:
-            self.geometry_program.release()
-        if self.lighting_program:
-            self.lighting_program.release()
-        if self.screen_program:
-            self.screen_program.release()
\ No newline at end of file
+        for vao in self._mesh_vaos.values():
+            vao.release()
+        self._mesh_vaos.clear()
+        self._release_particles()
+        for fence in self._ring_fences:
+            if fence is not None:
+                gl.glDeleteSync(fence)
+        self._ring_fences = [None] * RING_FRAMES
+        if self._instance_ring:
+            self._instance_ring.release()
+        for program in self._programs.values():
+            program.release()
+        self._programs.clear()
+        self.geometry_program = None
+        self.lighting_program = None
+        self.screen_program = None
+        self.particle_program = None
+
+
+@njit(cache=True)
+def build_draw_list(active, visible, mesh_ids, counts, offsets, rows):
+    """Bucket the drawable rows by mesh ID (a counting sort)
+    
+    On return, ``rows[offsets[m]:offsets[m] + counts[m]]`` are the rows of
+    active, visible entities using mesh ``m``, in row order.
+    
+    Returns the total number of drawable rows.
+    """
+    counts[:] = 0
+    for i in range(active.shape[0]):
+        if active[i] and visible[i]:
+            counts[mesh_ids[i]] += 1
+    
+    total = 0
+    for m in range(counts.shape[0]):
+        offsets[m] = total
+        total += counts[m]
+    
+    # Fill each bucket, using offsets as write cursors, then rewind them
+    for i in range(active.shape[0]):
+        if active[i] and visible[i]:
+            m = mesh_ids[i]
+            rows[offsets[m]] = i
+            offsets[m] += 1
+    for m in range(counts.shape[0]):
+        offsets[m] -= counts[m]
+    
+    return total
@@ -10,7 +10,7 @@ from engine.core.application import EngineApplication
 from engine.core.scene import Scene, Entity, Camera
 from engine.core.component import Transform, Renderable, PhysicsBody
 from engine.physics.fracture import DestructibleCube
-from engine.physics.sph import SPHSystem
+from engine.physics.sph_cuda import create_sph_system
 
 
 def create_demo_scene():
@@ -42,10 +42,10 @@ def create_demo_scene():
         position=np.array([0.0, 2.0, 0.0]),
         size=np.array([1.0, 1.0, 1.0])
     )
-    cube_entity.destructible = destructible_cube  # Store reference for interaction
+    cube_entity.add_component(destructible_cube)  # Store reference for interaction
     
     # Create fluid particles
-    sph_system = SPHSystem(particle_count=2000)
+    sph_system = create_sph_system(particle_count=2000)
     
     # Add some simple light entities (simplified representation)
     light_entity = Entity("MainLight")
@@ -69,20 +69,28 @@ def main():
     engine_app.scene = scene
     engine_app.physics_system = sph_system  # Override with SPH system
     
+    # Pregenerated random impact offsets, consumed as a ring buffer
+    impact_offsets = np.random.default_rng().uniform(-0.2, 0.2, (1024, 3)).astype(np.float32)
+    next_offset = 0
+    
     # Add mouse click interaction for destructible cube
     def handle_mouse_click(x, y):
         """Handle mouse clicks to break cubes"""
+        nonlocal next_offset
         # Find destructible cube in scene
         for entity in scene.entities:
-            if hasattr(entity, 'destructible') and entity.name == "DestructibleCube":
+            destructible = entity.get_component(DestructibleCube)
+            if destructible is not None and entity.name == "DestructibleCube":
                 # Apply damage at a position near the cube
-                impact_pos = entity.transform.position + np.random.uniform(-0.2, 0.2, 3)
-                entity.destructible.apply_damage(150.0, impact_pos)  # High damage to ensure breakage
+                impact_pos = entity.transform.position + impact_offsets[next_offset]
+                next_offset = (next_offset + 1) % len(impact_offsets)
+                destructible.apply_damage(150.0, impact_pos)  # High damage to ensure breakage
                 
                 # If cube is broken, replace with fragments
-                if entity.destructible.is_broken():
-                    fragments = entity.destructible.get_fragments()
-                    for frag_data in fragments:
+                if destructible.is_broken():
+                    fragments = destructible.get_fragments()
+                    new_entities = [None] * len(fragments)
+                    for i, frag_data in enumerate(fragments):
                         frag_entity = Entity("Fragment")
                         frag_entity.transform = frag_data['transform']
                         
@@ -94,7 +102,10 @@ def main():
                         frag_renderable = Renderable()
                         frag_entity.add_component(frag_renderable)
                         
-                        scene.add_entity(frag_entity)
+                        new_entities[i] = frag_entity
+                    
+                    # Add all fragments in one batch
+                    scene.add_entities(new_entities)
                     
                     # Remove original cube
                     scene.remove_entity(entity)